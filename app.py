@@ -1,8 +1,7 @@
-from flask import Flask, render_template, request, jsonify, send_file
-import pandas as pd
+from flask import Flask, Response, render_template, request, jsonify
 import threading
+import queue
 import time
-import io
 import uuid
 from email.mime.text import MIMEText
 import smtplib
@@ -10,16 +9,34 @@ import os
 import json
 import logging
 import traceback
-from datetime import datetime
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 # Import the actual scraper
-from scraper.geonames_scraper import scrape_geonames_postcodes
+from scraper.geonames_scraper import scrape_geonames_postcodes, STATE_MAP
+from scraper.crawl import run_crawl, CRAWL_CONCURRENCY, CRAWL_RATE
+from scraper.city_index import find_city_postcodes, CITY_INDEX_TTL
+from scraper.row_parser import PostcodeRow
+from scraper.debug_capture import debug_capture
 # Import Supabase utilities
-from supabase_utils.db_client import get_all_postcodes, supabase
+from supabase_utils.db_client import (
+    count_postcodes, get_recent_postcodes, get_postcode_counts_by_region,
+    get_region_postcodes, get_regions, get_client, get_pool_stats
+)
+from supabase_utils.id_cache import location_ids
+from supabase_utils.stats_cache import StatsCache
+from supabase_utils.job_store import JobStore
+from supabase_utils.job_cache import JobCache
+from supabase_utils.export import (
+    EXPORT_FORMATS, JOB_COLUMNS, REGION_COLUMNS, iter_export, iter_job_rows, iter_region_rows, parquet_available
+)
+# Durable job queue and worker pool
+from worker.job_queue import JobQueue, QueueFullError
+from worker.pool import WorkerPool
+from worker.events import JobEventBus, is_terminal
 
 app = Flask(__name__)
 
@@ -30,15 +47,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize the jobs dictionary (temporary in-memory storage)
-# This will be replaced with Supabase storage
-jobs = {}
+# Scrape jobs are queued in SQLite and run by a bounded worker pool. Set
+# RUN_INPROCESS_WORKERS=0 to only enqueue here and run `python -m worker` separately.
+RUN_INPROCESS_WORKERS = os.environ.get("RUN_INPROCESS_WORKERS", "1") not in ("0", "false", "False")
+job_queue = JobQueue()
+
+# Job rows in Supabase: one request per status change, results written once at completion
+job_store = JobStore()
+
+# Recently used jobs (status and preview) are kept in memory within a size budget;
+# full results stay in Supabase and are loaded when a job is exported
+jobs = JobCache(job_store, pin_active=RUN_INPROCESS_WORKERS)
+
+# Job status changes and progress are pushed to /job/<id>/events subscribers.
+# Each open stream holds a server thread, so only SSE_MAX_STREAMS are served at
+# once; other clients are refused and fall back to polling /job/<id>.
+job_events = JobEventBus()
+SSE_MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS", "4"))
+SSE_KEEPALIVE = float(os.environ.get("SSE_KEEPALIVE", "15"))
+SSE_MAX_SECONDS = float(os.environ.get("SSE_MAX_SECONDS", "300"))
+sse_streams = threading.BoundedSemaphore(SSE_MAX_STREAMS)
 
 # Function to create jobs table in Supabase if it doesn't exist
 def ensure_jobs_table_exists():
     try:
         # Check if jobs table exists by attempting to query it
-        response = supabase.table("jobs").select("id").limit(1).execute()
+        response = get_client().table("jobs").select("id").limit(1).execute()
         logger.info("Jobs table exists in Supabase")
         return True
     except Exception as e:
@@ -59,6 +93,7 @@ def ensure_jobs_table_exists():
                     message TEXT,
                     db_entries INTEGER DEFAULT 0,
                     error_details TEXT,
+                    complete BOOLEAN NOT NULL DEFAULT FALSE,
                     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
                     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
                 );
@@ -87,87 +122,54 @@ STATES = [
     "Texas", "Utah", "Vermont", "Virginia", "Washington", "West Virginia", "Wisconsin", "Wyoming"
 ]
 
-# Run setup tasks at import time instead of using before_first_request
+# Setup tasks run once per process instead of using before_first_request
 def setup_app():
     """Initialize application components"""
     try:
         # Ensure the jobs table exists
         ensure_jobs_table_exists()
+        # Load every country and region id in one query before the first scrape needs them
+        location_ids.warm()
     except Exception as e:
         logger.error(f"Error during app initialization: {e}", exc_info=True)
 
-# Run setup at import time
-setup_app()
+# Run setup in the background so importing the app (and booting a worker) never waits on the network
+threading.Thread(target=setup_app, name="app-setup", daemon=True).start()
 
-# Function to save job to Supabase
-def save_job_to_supabase(job_id, job_data):
+def get_last_full_scrape_time(state):
+    """
+    Returns when a whole-state job for this state last completed with every
+    page read and every row stored (the jobs.complete flag), as a Unix timestamp.
+    """
     try:
-        # Convert job data to a format suitable for Supabase
-        supabase_job = {
-            "id": job_id,
-            "status": job_data.get("status", "unknown"),
-            "state": job_data.get("state", ""),
-            "city": job_data.get("city", None),
-            "results": json.dumps(job_data.get("results", [])),
-            "preview": json.dumps(job_data.get("preview", [])),
-            "results_count": job_data.get("results_count", 0),
-            "message": job_data.get("message", None),
-            "db_entries": job_data.get("db_entries", 0),
-            "error_details": job_data.get("error_details", None),
-            "updated_at": datetime.now().isoformat()
-        }
-        
-        # Try to create the table if it doesn't exist
-        try:
-            ensure_jobs_table_exists()
-        except Exception as table_error:
-            logger.error(f"Error ensuring jobs table exists: {table_error}")
-            # Continue anyway - we'll try the operation
-        
-        # Check if job already exists
-        try:
-            response = supabase.table("jobs").select("id").eq("id", job_id).execute()
-            
-            if response.data:
-                # Update existing job
-                supabase.table("jobs").update(supabase_job).eq("id", job_id).execute()
-                logger.info(f"Updated job {job_id} in Supabase")
-            else:
-                # Insert new job
-                supabase_job["created_at"] = datetime.now().isoformat()
-                supabase.table("jobs").insert(supabase_job).execute()
-                logger.info(f"Inserted job {job_id} into Supabase")
-            
-            return True
-        except Exception as e:
-            logger.error(f"Failed to save job to Supabase: {e}")
-            # If we get here, we'll fall back to in-memory storage only
-            return False
+        response = (get_client().table("jobs").select("updated_at")
+                    .eq("state", state).eq("status", "completed").is_("city", "null").is_("complete", "true")
+                    .order("updated_at", desc=True).limit(1).execute())
+        if not response.data:
+            return None
+        updated_at = datetime.fromisoformat(response.data[0]["updated_at"])
+        # A timestamp column without a time zone returns naive values; JobStore writes them in UTC
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        return updated_at.timestamp()
     except Exception as e:
-        logger.error(f"Failed to prepare job data for Supabase: {e}")
-        return False
+        logger.error(f"Failed to get last scrape time for {state}: {e}")
+        return None
 
-# Function to get job from Supabase
-def get_job_from_supabase(job_id):
+def load_fresh_state_rows(state):
+    """Loads a state's stored postcodes if a whole-state scrape completed within the index TTL."""
+    scraped_at = get_last_full_scrape_time(state)
+    if scraped_at is None or time.time() - scraped_at >= CITY_INDEX_TTL:
+        return None
+    region_id = location_ids.region_id(state, create=False)
+    if region_id is None:
+        return None
     try:
-        response = supabase.table("jobs").select("*").eq("id", job_id).execute()
-        
-        if not response.data:
-            return None
-        
-        job_data = response.data[0]
-        
-        # Convert JSON strings back to Python objects
-        if isinstance(job_data.get("results"), str):
-            job_data["results"] = json.loads(job_data.get("results", "[]"))
-        
-        if isinstance(job_data.get("preview"), str):
-            job_data["preview"] = json.loads(job_data.get("preview", "[]"))
-        
-        return job_data
+        rows = [PostcodeRow(row["place_name"], row["code"]) for row in get_region_postcodes(region_id)]
     except Exception as e:
-        logger.error(f"Failed to get job from Supabase: {e}")
+        logger.error(f"Failed to load stored postcodes for {state}: {e}")
         return None
+    return (rows, scraped_at) if rows else None
 
 def get_available_states():
     """Returns the list of states for the dropdown."""
@@ -180,34 +182,34 @@ def index():
     return render_template('index.html', states=get_available_states(), db_stats=db_stats)
 
 def get_database_stats():
-    """Get statistics about the Supabase database for display"""
+    """Get statistics about the Supabase database for display (served from the stats cache)"""
+    return stats_cache.get()
+
+def presentation_rows(rows):
+    """API shape of (place_name, code) rows; previews of older stored jobs are already dicts"""
+    return [row if isinstance(row, dict) else {"Post-Code": row[1], "City/Town": row[0]} for row in rows]
+
+def format_recent_entries(postcodes):
+    """Formats postcode rows for the recent-entries display"""
+    return [
+        {
+            "Post-Code": postcode.get("code", ""),
+            "City/Town": postcode.get("place_name", "")
+        }
+        for postcode in postcodes
+    ]
+
+def compute_database_stats():
+    """Compute statistics about the Supabase database from scratch"""
     try:
-        # Get total count of postcodes
-        postcodes = get_all_postcodes()
-        total_postcodes = len(postcodes)
+        # Get total count of postcodes (exact count header, no rows transferred)
+        total_postcodes = count_postcodes()
         
         # Get recent entries (last 5)
-        recent_postcodes = postcodes[-5:] if total_postcodes > 0 else []
+        recent_entries = format_recent_entries(get_recent_postcodes(5))
         
-        # Format recent entries for display
-        recent_entries = []
-        for postcode in recent_postcodes:
-            recent_entries.append({
-                "Post-Code": postcode.get("code", ""),
-                "City/Town": postcode.get("place_name", "")
-            })
-        
-        # Get count by region if available
-        region_counts = {}
-        try:
-            response = supabase.table("regions").select("id,name").execute()
-            regions = {r['id']: r['name'] for r in response.data}
-            
-            for region_id, region_name in regions.items():
-                count_response = supabase.table("postcodes").select("id").eq("region_id", region_id).execute()
-                region_counts[region_name] = len(count_response.data)
-        except Exception as e:
-            print(f"Error getting region counts: {e}")
+        # Get count by region in one grouped query
+        region_counts = get_postcode_counts_by_region()
         
         return {
             "total_postcodes": total_postcodes,
@@ -223,6 +225,9 @@ def get_database_stats():
             "error": str(e)
         }
 
+# Stats are recomputed at most once per TTL and kept current by committing jobs
+stats_cache = StatsCache(compute_database_stats)
+
 @app.route('/scrape', methods=['POST'])
 def scrape_postcodes_route():
     state = request.form.get('state')
@@ -234,8 +239,94 @@ def scrape_postcodes_route():
     # Generate a unique job ID
     job_id = str(uuid.uuid4())
     
-    # Initialize job data
-    job_data = {
+    # Identical requests already in flight (or just finished) are coalesced onto that job
+    job_data = new_job_data(state, city)
+    try:
+        leader_id = submit_job(job_id, job_data, "scrape", {"state": state, "city": city},
+                               dedupe_key=scrape_dedupe_key(state, city))
+    except QueueFullError as e:
+        return queue_full_response(e)
+    
+    if leader_id != job_id:
+        job_data["coalesced_with"] = leader_id
+        logger.info(f"Job {job_id} coalesced onto job {leader_id} ({state}, {city})")
+        resolve_coalesced_job(job_id, job_data)
+
+    return jsonify({"status": "started", "job_id": job_id})
+
+def submit_job(job_id, job_data, kind, payload, dedupe_key=None):
+    """
+    Stores a new job, then queues it, and returns the id of the job doing the work.
+    
+    The stored row has to exist before a worker can pick the job up: created
+    afterwards, its "pending" upsert could land after the worker's "running"
+    or "completed" update and leave the job pending for good. A job refused by
+    a full queue is removed again before QueueFullError propagates.
+    """
+    jobs[job_id] = job_data
+    job_store.create(job_id, job_data)
+    try:
+        return job_queue.enqueue(job_id, kind, payload, dedupe_key=dedupe_key)
+    except QueueFullError:
+        jobs.pop(job_id)
+        job_store.delete(job_id)
+        raise
+
+def scrape_dedupe_key(state, city=None):
+    """Key under which identical scrape requests are coalesced"""
+    return f"{state.strip().lower()}|{(city or '').strip().lower()}"
+
+# Job fields a coalesced job takes over from the job that did the work
+SHARED_JOB_FIELDS = ("status", "results", "preview", "results_count", "message", "db_entries",
+                     "engine", "changes", "timings", "error_details")
+
+def copy_job_outcome(source, target):
+    """Copies a finished job's outcome into a job that was coalesced onto it"""
+    for field in SHARED_JOB_FIELDS:
+        if field in source:
+            target[field] = source[field]
+
+def resolve_coalesced_job(job_id, job):
+    """
+    Brings a coalesced job up to date with its leader.
+
+    Finished leaders push their outcome to followers (share_job_outcome), but a
+    follower that attached around the time its leader finished may have missed
+    that, so followers also pull the outcome when they are read.
+    """
+    leader_id = job.get("coalesced_with")
+    if not leader_id or job["status"] not in ("pending", "running"):
+        return job
+    leader = jobs.get(leader_id)
+    if leader is None or (not RUN_INPROCESS_WORKERS and leader["status"] in ("pending", "running")):
+        leader = job_store.get(leader_id) or leader
+    if leader is None:
+        return job
+    if leader["status"] in ("completed", "failed"):
+        copy_job_outcome(leader, job)
+        if leader["status"] == "completed" and "results" not in leader:
+            job["results"] = jobs.results(leader_id)
+        jobs.complete(job_id, job)
+        publish_job_status(job_id, job)
+    else:
+        job["status"] = leader["status"]
+    return job
+
+def share_job_outcome(job_id, job):
+    """Pushes a finished job's outcome to every job coalesced onto it"""
+    follower_ids = job_queue.followers(job_id)
+    results = jobs.results(job_id) if follower_ids and job["status"] == "completed" else []
+    for follower_id in follower_ids:
+        follower = jobs.get(follower_id) or new_job_data(job["state"], job.get("city"))
+        follower["coalesced_with"] = job_id
+        copy_job_outcome(job, follower)
+        follower["results"] = results
+        jobs.complete(follower_id, follower)
+        publish_job_status(follower_id, follower)
+
+def new_job_data(state, city=None):
+    """Initial job data for a newly queued scrape"""
+    return {
         "status": "pending",
         "state": state,
         "city": city,
@@ -245,31 +336,74 @@ def scrape_postcodes_route():
         "message": None,
         "db_entries": 0  # Track how many entries were added to the database
     }
-    
-    # Store in memory temporarily
-    jobs[job_id] = job_data
-    
-    # Save to Supabase
-    save_job_to_supabase(job_id, job_data)
 
-    # Start the scraper in a background thread
-    thread = threading.Thread(target=run_scraper_thread, args=(job_id, state, city))
-    thread.daemon = True
-    thread.start()
-
-    return jsonify({"status": "started", "job_id": job_id})
+def queue_full_response(error):
+    """429 telling the client to back off while the queue drains"""
+    response = jsonify({
+        "status": "error",
+        "message": "Too many scrape jobs are waiting. Please try again shortly.",
+        "queue_depth": error.depth
+    })
+    response.status_code = 429
+    response.headers["Retry-After"] = "30"
+    return response
+
+def run_scrape_job(job_id, payload):
+    """Worker pool handler for 'scrape' jobs"""
+    job = run_scraper_thread(job_id, payload["state"], payload.get("city"))
+    share_job_outcome(job_id, job)
+    # Failing the queue entry keeps later identical requests from reusing this outcome
+    if job["status"] == "failed":
+        raise RuntimeError(job["message"])
+
+def describe_changes(changes):
+    """One-line summary of what a scrape changed in the database, e.g. '3 new, 1 updated, 0 removed, 120 unchanged'"""
+    summary = (f"{changes['inserted']} new, {changes['updated']} updated, "
+               f"{changes['deleted']} removed, {changes['unchanged']} unchanged")
+    if changes.get("deletes_skipped"):
+        summary += f" ({changes['deletes_skipped']} not removed: partial scrape)"
+    return summary
 
 def run_scraper_thread(job_id, state, city):
-    """Runs the scraper and updates the job dictionary."""
+    """
+    Runs the scraper and updates the job dictionary, which it returns.
+    The job is held here rather than looked up in `jobs` again, since the
+    cache may evict it while the scrape runs.
+    """
+    # Jobs queued before a restart or by another process aren't in memory yet
+    job = jobs.get(job_id)
+    if job is None:
+        job = job_store.get(job_id) or new_job_data(state, city)
+        jobs[job_id] = job
     try:
         # Update job status to running
-        jobs[job_id]["status"] = "running"
-        save_job_to_supabase(job_id, jobs[job_id])
+        job["status"] = "running"
+        job_store.update(job_id, status="running")
+        jobs.put(job_id, job)
+        publish_job_status(job_id, job)
         
         logger.info(f"Starting scraper for Job ID: {job_id}, State: {state}, City: {city}")
         
-        # Call the actual scraper function
-        results_list = scrape_geonames_postcodes(state, city_filter=city)
+        # City lookups are answered from the state's indexed postcodes when they are fresh
+        # Debug captures of this job's pages are named after it
+        scrape_report = {"capture_label": job_id}
+        results_list = find_city_postcodes(state, city, load_fresh_state_rows) if city else None
+        if results_list is not None:
+            scrape_report["engine"] = "local-index"
+        else:
+            # Call the actual scraper function
+            results_list = scrape_geonames_postcodes(state, city_filter=city, report=scrape_report,
+                                                     on_progress=lambda progress: publish_job_progress(job_id, progress))
+            stats_cache.apply_commit(state, scrape_report.get("db_inserted", 0),
+                                     format_recent_entries(scrape_report.get("db_recent", [])),
+                                     deleted=scrape_report.get("db_deleted", 0))
+        job["engine"] = scrape_report.get("engine")
+        job["changes"] = scrape_report.get("changes")
+        job["timings"] = scrape_report.get("timings")
+        job["browser_requests"] = scrape_report.get("browser_requests")
+        # Only complete whole-state scrapes let later city jobs use the stored postcodes
+        job["complete"] = bool(scrape_report.get("complete"))
+        logger.info(f"Job {job_id} served by the '{scrape_report.get('engine')}' engine")
         
         # Check if results_list is None or empty and provide detailed logging
         if results_list is None:
@@ -280,74 +414,214 @@ def run_scraper_thread(job_id, state, city):
         else:
             logger.info(f"Scraper returned {len(results_list)} results for state: {state}, city: {city}")
         
-        # Format the results for our application with renamed fields
-        formatted_results = []
-        for item in results_list:
-            formatted_result = {
-                "Post-Code": item.get("code", ""),
-                "City/Town": item.get("place_name", "")
-            }
-            formatted_results.append(formatted_result)
-        
-        # Update the job with results
-        jobs[job_id]["results"] = formatted_results
-        jobs[job_id]["results_count"] = len(formatted_results)
-        jobs[job_id]["preview"] = formatted_results[:5] if formatted_results else []
+        # Update the job with results, kept as (place_name, code) records
+        job["results"] = results_list
+        job["results_count"] = len(results_list)
+        job["preview"] = results_list[:5]
         
-        if len(formatted_results) > 0:
-            jobs[job_id]["status"] = "completed"
-            jobs[job_id]["message"] = f"Found {len(formatted_results)} postcodes for {state}" + (f" ({city})" if city else "")
+        if len(results_list) > 0:
+            job["status"] = "completed"
+            job["message"] = f"Found {len(results_list)} postcodes for {state}" + (f" ({city})" if city else "")
         else:
-            jobs[job_id]["status"] = "completed"
-            jobs[job_id]["message"] = f"No postcodes found for {state}" + (f" ({city})" if city else "")
+            job["status"] = "completed"
+            job["message"] = f"No postcodes found for {state}" + (f" ({city})" if city else "")
+        if job["changes"]:
+            job["message"] += " - " + describe_changes(job["changes"])
         
         # Get the count of database entries after scraping
         try:
-            postcodes = get_all_postcodes()
-            jobs[job_id]["db_entries"] = len(postcodes)
+            job["db_entries"] = get_database_stats()["total_postcodes"]
         except Exception as e:
             logger.error(f"Error getting database count: {e}")
-            jobs[job_id]["db_entries"] = 0
+            job["db_entries"] = 0
         
-        # Save updated job to Supabase
-        save_job_to_supabase(job_id, jobs[job_id])
+        # Save the results and final status to Supabase
+        jobs.complete(job_id, job)
+        publish_job_status(job_id, job)
         
-        logger.info(f"Job {job_id} completed. Found {len(formatted_results)} postcodes.")
+        logger.info(f"Job {job_id} completed. Found {len(results_list)} postcodes.")
 
     except Exception as e:
         logger.error(f"Job {job_id} failed: {e}", exc_info=True)
         
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["message"] = str(e)
-        jobs[job_id]["error_details"] = traceback.format_exc()
+        job["status"] = "failed"
+        job["message"] = str(e)
+        job["error_details"] = traceback.format_exc()
         
         # Save failed job to Supabase
-        save_job_to_supabase(job_id, jobs[job_id])
+        job_store.update(job_id, status="failed", message=job["message"],
+                         error_details=job["error_details"])
+        jobs.put(job_id, job)
+        publish_job_status(job_id, job)
+    
+    return job
+
+@app.route('/crawl', methods=['POST'])
+def crawl_states_route():
+    """Starts a bulk crawl of many states, tracked as one parent job."""
+    payload = request.get_json(silent=True) or {}
+    states = payload.get("states") or request.form.getlist('states')
+    if not states or states == ["all"]:
+        states = list(STATE_MAP)
+    
+    unknown = [state for state in states if state not in STATE_MAP]
+    if unknown:
+        return jsonify({"status": "error", "message": f"Unknown states: {', '.join(unknown)}"}), 400
+    
+    concurrency = payload.get("concurrency", request.form.get('concurrency'))
+    rate = payload.get("rate", request.form.get('rate'))
+    try:
+        concurrency = CRAWL_CONCURRENCY if concurrency in (None, "") else int(concurrency)
+        rate = CRAWL_RATE if rate in (None, "") else float(rate)
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "concurrency and rate must be numbers"}), 400
+    if not (concurrency > 0 and rate > 0):
+        return jsonify({"status": "error", "message": "concurrency and rate must be positive"}), 400
+    
+    # The configured values are the ceiling; callers may only crawl more gently
+    concurrency = min(concurrency, CRAWL_CONCURRENCY)
+    rate = min(rate, CRAWL_RATE)
+    
+    job_id = str(uuid.uuid4())
+    try:
+        submit_job(job_id, new_crawl_job_data(states), "crawl",
+                   {"states": states, "concurrency": concurrency, "rate": rate})
+    except QueueFullError as e:
+        return queue_full_response(e)
+    
+    return jsonify({"status": "started", "job_id": job_id, "states": len(states)})
+
+def new_crawl_job_data(states):
+    """Initial job data for a newly queued crawl"""
+    job_data = new_job_data("All states" if len(states) == len(STATE_MAP) else ", ".join(states))
+    job_data["type"] = "crawl"
+    job_data["progress"] = {
+        "states_total": len(states),
+        "states_done": 0,
+        "states_failed": 0,
+        "per_state": {state: {"status": "pending"} for state in states}
+    }
+    return job_data
+
+def run_crawl_job(job_id, payload):
+    """Worker pool handler for 'crawl' jobs"""
+    run_crawl_thread(job_id, payload["states"], payload["concurrency"], payload["rate"])
+
+def run_crawl_thread(job_id, states, concurrency, rate):
+    """Runs a bulk crawl and aggregates per-state progress into the parent job."""
+    # Crawl progress lives in memory, so a crawl picked up after a restart starts over
+    job = jobs.get(job_id)
+    if job is None or "progress" not in job:
+        job = new_crawl_job_data(states)
+        jobs[job_id] = job
+    progress = job["progress"]
+    progress_lock = threading.Lock()
+    
+    def on_progress(state, summary):
+        # Runs in a crawl worker thread, possibly for several states at once
+        with progress_lock:
+            progress["per_state"][state] = summary
+            progress["states_done"] += 1
+            if summary["status"] != "completed":
+                progress["states_failed"] += 1
+            job["results_count"] += summary["results_count"]
+            job["message"] = f"{progress['states_done']}/{progress['states_total']} states done"
+            states_done, results_count, message = progress["states_done"], job["results_count"], job["message"]
+        stats_cache.apply_commit(state, summary.get("db_inserted", 0),
+                                 format_recent_entries(summary.get("db_recent", [])),
+                                 deleted=summary.get("db_deleted", 0))
+        job_store.update(job_id, results_count=results_count, message=message)
+        # Each summary grows the job; the cache adds its size rather than re-measuring the whole crawl
+        jobs.grow(job_id, job, summary)
+        publish_job_progress(job_id, {"stage": "crawling", "states_done": states_done,
+                                      "states_total": progress["states_total"], "rows_found": results_count})
+    
+    try:
+        job["status"] = "running"
+        job_store.update(job_id, status="running")
+        jobs.put(job_id, job)
+        publish_job_status(job_id, job)
+        logger.info(f"Starting crawl job {job_id} for {len(states)} states (concurrency={concurrency}, rate={rate}/s)")
+        
+        run_crawl(states, concurrency=concurrency, rate=rate, on_progress=on_progress)
+        
+        job["status"] = "completed"
+        job["message"] = (f"Crawled {progress['states_total']} states: {job['results_count']} postcodes, "
+                          f"{progress['states_failed']} states failed")
+        job_store.update(job_id, status="completed", results_count=job["results_count"], message=job["message"])
+        jobs.put(job_id, job)
+        publish_job_status(job_id, job)
+        logger.info(f"Crawl job {job_id} completed. {job['message']}")
+    except Exception as e:
+        logger.error(f"Crawl job {job_id} failed: {e}", exc_info=True)
+        job["status"] = "failed"
+        job["message"] = str(e)
+        job["error_details"] = traceback.format_exc()
+        job_store.update(job_id, status="failed", message=job["message"], error_details=job["error_details"])
+        jobs.put(job_id, job)
+        publish_job_status(job_id, job)
+
+JOB_HANDLERS = {
+    "scrape": run_scrape_job,
+    "crawl": run_crawl_job,
+}
 
 @app.route('/job/<job_id>', methods=['GET'])
 def get_job_status(job_id):
     # Try to get job from memory first
     job = jobs.get(job_id)
     
+    # Standalone workers report progress through Supabase, not this process's memory
+    if job and not RUN_INPROCESS_WORKERS and job["status"] in ("pending", "running"):
+        job = job_store.get(job_id) or job
+        jobs[job_id] = job
+    
     # If not in memory, try to get from Supabase
     if not job:
-        job = get_job_from_supabase(job_id)
+        job = job_store.get(job_id)
         
         # If found in Supabase, cache in memory
         if job:
             jobs[job_id] = job
     
+    if job:
+        resolve_coalesced_job(job_id, job)
+    
+    # A job still waiting in the queue is known even if Supabase is unreachable
+    if not job:
+        queued = job_queue.get(job_id)
+        if queued and queued["status"] in ("queued", "running"):
+            return jsonify({"status": "pending" if queued["status"] == "queued" else "running"})
+    
     if not job:
         return jsonify({"status": "error", "message": "Job not found"}), 404
 
+    return jsonify(job_status_payload(job))
+
+def job_status_payload(job):
+    """What /job/<id> reports for a job; also the data of its SSE status events"""
     # Return status and preview data if completed
     response_data = {"status": job["status"]}
     
+    # Crawl jobs report aggregated per-state progress while running
+    if job.get("type") == "crawl":
+        response_data["progress"] = job.get("progress")
+        response_data["message"] = job.get("message", "")
+    
     if job["status"] == "completed":
-        response_data["preview"] = job["preview"] or []
+        response_data["preview"] = presentation_rows(job["preview"] or [])
         response_data["results_count"] = job["results_count"]
         response_data["db_entries"] = job.get("db_entries", 0)
         response_data["message"] = job.get("message", "")
+        response_data["engine"] = job.get("engine")
+        if job.get("changes"):
+            response_data["changes"] = job["changes"]
+        if job.get("timings"):
+            response_data["timings"] = job["timings"]
+        if job.get("browser_requests"):
+            response_data["browser_requests"] = job["browser_requests"]
+        if job.get("coalesced_with"):
+            response_data["coalesced_with"] = job["coalesced_with"]
         
         # Get fresh database stats
         try:
@@ -363,7 +637,80 @@ def get_job_status(job_id):
         if "error_details" in job:
             response_data["error_details"] = job["error_details"]
 
-    return jsonify(response_data)
+    return response_data
+
+def publish_job_status(job_id, job):
+    """Pushes a job's current status to its event stream subscribers"""
+    job_events.publish(job_id, {"type": "status", "job_id": job_id, **job_status_payload(job)})
+
+def publish_job_progress(job_id, progress):
+    """Pushes row-count progress of a running job to its event stream subscribers"""
+    job_events.publish(job_id, {"type": "progress", "job_id": job_id, **progress})
+
+def sse_message(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+@app.route('/job/<job_id>/events', methods=['GET'])
+def job_events_route(job_id):
+    """Server-Sent Events stream of a job's status changes and progress, ending once it finishes"""
+    # Standalone workers publish in their own process; 204 tells EventSource to stop and the page to poll
+    if not RUN_INPROCESS_WORKERS:
+        return "", 204
+    
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    if not sse_streams.acquire(blocking=False):
+        return jsonify({"status": "error", "message": "Too many open event streams, poll /job/<id> instead"}), 503
+    
+    # A coalesced job's progress comes from the job doing the work
+    job_ids = [job_id] + ([job["coalesced_with"]] if job.get("coalesced_with") else [])
+    subscription = job_events.subscribe(job_ids)
+    
+    def stream():
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        yield "retry: 3000\n\n"
+        if job_events.latest(job_id) is None:
+            event = {"type": "status", "job_id": job_id, **job_status_payload(job)}
+            yield sse_message(event)
+            if is_terminal(event):
+                return
+        while time.monotonic() < deadline:
+            try:
+                event = subscription.get(timeout=SSE_KEEPALIVE)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if is_terminal(event) and event["job_id"] != job_id:
+                # The leader finished: report this job's own final status instead
+                resolve_coalesced_job(job_id, job)
+                event = {"type": "status", "job_id": job_id, **job_status_payload(job)}
+            yield sse_message(event)
+            if is_terminal(event):
+                return
+        # Past the deadline EventSource reconnects and resumes from the latest event
+    
+    def close_stream():
+        job_events.unsubscribe(job_ids, subscription)
+        sse_streams.release()
+    
+    response = Response(stream(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(close_stream)
+    return response
+
+@app.route('/queue-stats')
+def queue_stats_route():
+    """API endpoint for job queue depth, wait times, worker usage and database latency"""
+    stats = job_queue.stats()
+    stats["workers"] = worker_pool.stats() if worker_pool else None
+    stats["job_store"] = job_store.stats()
+    stats["events"] = job_events.stats()
+    stats["db_pool"] = get_pool_stats()
+    stats["id_cache"] = location_ids.stats()
+    stats["job_cache"] = jobs.stats()
+    stats["debug_capture"] = debug_capture.stats()
+    return jsonify(stats)
 
 @app.route('/database-stats')
 def database_stats_route():
@@ -372,38 +719,60 @@ def database_stats_route():
 
 @app.route('/download/<job_id>')
 def download_results(job_id):
-    # Try to get job from memory first
-    job = jobs.get(job_id)
+    """CSV of a completed job's results (the page's download link)"""
+    return export_job(job_id, "csv")
+
+@app.route('/export', methods=['GET'])
+def export_route():
+    """
+    Streams postcodes as ?format=csv (default), ndjson or parquet, for one of:
+    job_id=<id> (that job's results), region=<state name> or country=<country name>.
+    Rows are read and encoded a chunk at a time, so any size of export runs in constant memory.
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"status": "error",
+                        "message": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    if export_format == "parquet" and not parquet_available():
+        return jsonify({"status": "error", "message": "Parquet export needs pyarrow installed on the server"}), 400
     
-    # If not in memory, try to get from Supabase
-    if not job:
-        job = get_job_from_supabase(job_id)
+    job_id = request.args.get('job_id')
+    region = request.args.get('region')
+    country = request.args.get('country')
     
+    if job_id:
+        return export_job(job_id, export_format)
+    if region:
+        region_id = location_ids.region_id(region, create=False)
+        if region_id is None:
+            return jsonify({"status": "error", "message": f"Region not found: {region}"}), 404
+        return export_response(iter_region_rows([{"id": region_id, "name": region}]), REGION_COLUMNS,
+                               export_format, region)
+    if country:
+        country_id = location_ids.country_id(country, create=False)
+        regions = get_regions(country_id) if country_id is not None else []
+        if not regions:
+            return jsonify({"status": "error", "message": f"No regions found for country: {country}"}), 404
+        return export_response(iter_region_rows(regions), REGION_COLUMNS, export_format, country)
+    return jsonify({"status": "error", "message": "One of job_id, region or country is required"}), 400
+
+def export_job(job_id, export_format):
+    """Streams a completed job's results"""
+    # Try to get job from memory first, then from Supabase
+    job = jobs.load(job_id)
     if not job or job['status'] != 'completed':
         return "Job not found or not completed", 404
     
-    # Create a DataFrame from the results
-    df = pd.DataFrame(job['results'])
-    
-    # Create a string buffer
-    buffer = io.StringIO()
-    df.to_csv(buffer, index=False)
-    
-    # Create a bytes buffer for the response
-    bytes_buffer = io.BytesIO()
-    bytes_buffer.write(buffer.getvalue().encode('utf-8'))
-    bytes_buffer.seek(0)
-    
-    # Generate filename
-    state = job['state'].lower().replace(' ', '_')
-    filename = f"postcodes_{state}.csv"
-    
-    return send_file(
-        bytes_buffer,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=filename
-    )
+    # Results are stored apart from the job and only loaded for exports
+    results = jobs.results(job_id)
+    return export_response(iter_job_rows(results), JOB_COLUMNS, export_format, job['state'])
+
+def export_response(rows, columns, export_format, name):
+    """Streaming attachment response for an export"""
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f"postcodes_{name.lower().replace(' ', '_')}.{extension}"
+    return Response(iter_export(rows, columns, export_format), mimetype=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 @app.route('/request-info', methods=['POST'])
 def request_info():
@@ -483,7 +852,7 @@ def debug_scraper():
                 "state": state,
                 "city": city,
                 "results_count": len(results) if results else 0,
-                "results": results[:10] if results else [],  # Return first 10 results
+                "results": presentation_rows(results[:10]) if results else [],  # Return first 10 results
                 "is_none": results is None,
                 "type": str(type(results)),
                 "scraper_info": {
@@ -498,7 +867,7 @@ def debug_scraper():
                 "state": state,
                 "city": city,
                 "results_count": len(results) if results else 0,
-                "sample_results": [r.get("code", "") for r in results[:5]] if results else []
+                "sample_results": [r.code for r in results[:5]] if results else []
             })
     except Exception as e:
         if is_development:
@@ -517,5 +886,18 @@ def debug_scraper():
                 "message": "An error occurred during scraping"
             }), 500
 
+# In-process workers start with the server, not on import: from gunicorn's
+# post_worker_init hook, or else with the first request
+worker_pool = WorkerPool(job_queue, JOB_HANDLERS) if RUN_INPROCESS_WORKERS else None
+
+def start_workers():
+    """Starts the in-process worker pool, which picks up any jobs still queued"""
+    if worker_pool:
+        worker_pool.start()
+
+@app.before_request
+def ensure_workers_started():
+    start_workers()
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-transition latency of job persistence.
+
+Runs the pending -> running -> completed transitions for a synthetic job
+through the old save path (table check + existence SELECT + full-row
+insert/update with the results re-serialised every time) and through
+JobStore, against the Supabase project in config.py / the environment.
+The benchmark jobs are deleted afterwards.
+
+    python benchmark_job_store.py [--results 5000] [--rounds 5]
+"""
+
+import sys
+import json
+import time
+import uuid
+import argparse
+import statistics
+from datetime import datetime
+
+from supabase_utils.db_client import get_client
+from supabase_utils.job_store import JobStore
+
+
+def synthetic_job(result_count):
+    results = [{"Post-Code": f"{i:05d}", "City/Town": f"Benchmark Town {i}"} for i in range(result_count)]
+    return {"status": "pending", "state": "Benchmark", "city": None, "results": [], "preview": [],
+            "results_count": 0, "message": None, "db_entries": 0}, results
+
+
+def legacy_save(job_id, job_data):
+    """The previous save_job_to_supabase, request for request."""
+    row = {
+        "id": job_id,
+        "status": job_data.get("status", "unknown"),
+        "state": job_data.get("state", ""),
+        "city": job_data.get("city", None),
+        "results": json.dumps(job_data.get("results", [])),
+        "preview": json.dumps(job_data.get("preview", [])),
+        "results_count": job_data.get("results_count", 0),
+        "message": job_data.get("message", None),
+        "db_entries": job_data.get("db_entries", 0),
+        "error_details": job_data.get("error_details", None),
+        "updated_at": datetime.now().isoformat()
+    }
+    get_client().table("jobs").select("id").limit(1).execute()  # ensure_jobs_table_exists()
+    response = get_client().table("jobs").select("id").eq("id", job_id).execute()
+    if response.data:
+        get_client().table("jobs").update(row).eq("id", job_id).execute()
+    else:
+        row["created_at"] = datetime.now().isoformat()
+        get_client().table("jobs").insert(row).execute()
+    return len(json.dumps(row))
+
+
+def run_legacy(result_count):
+    job_id = str(uuid.uuid4())
+    job, results = synthetic_job(result_count)
+    timings, sizes = {}, {}
+    for status in ("pending", "running", "completed"):
+        job["status"] = status
+        if status == "completed":
+            job.update(results=results, preview=results[:5], results_count=len(results))
+        started = time.perf_counter()
+        sizes[status] = legacy_save(job_id, job)
+        timings[status] = time.perf_counter() - started
+    return job_id, timings, sizes
+
+
+def run_job_store(store, result_count):
+    job_id = str(uuid.uuid4())
+    job, results = synthetic_job(result_count)
+    timings, sizes = {}, {}
+
+    started = time.perf_counter()
+    store.create(job_id, job)
+    timings["pending"] = time.perf_counter() - started
+    sizes["pending"] = len(json.dumps(JobStore._summary(job)))
+
+    started = time.perf_counter()
+    store.update(job_id, status="running")
+    timings["running"] = time.perf_counter() - started
+    sizes["running"] = len(json.dumps({"status": "running"}))
+
+    job.update(status="completed", results=results, preview=results[:5], results_count=len(results))
+    started = time.perf_counter()
+    store.complete(job_id, job)
+    timings["completed"] = time.perf_counter() - started
+    sizes["completed"] = len(json.dumps(JobStore._summary(job))) + len(json.dumps(results))
+    return job_id, timings, sizes
+
+
+def report(label, runs):
+    print(label)
+    for status in ("pending", "running", "completed"):
+        ms = [timings[status] * 1000 for _, timings, _ in runs]
+        size = runs[0][2][status]
+        print(f"  {status:<10} median {statistics.median(ms):8.1f} ms   max {max(ms):8.1f} ms   "
+              f"payload {size / 1024:8.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results", type=int, default=5000, help="Results in the synthetic job")
+    parser.add_argument("--rounds", type=int, default=5, help="Jobs run through each path")
+    args = parser.parse_args()
+
+    store = JobStore()
+    legacy_runs, store_runs = [], []
+    try:
+        for _ in range(args.rounds):
+            legacy_runs.append(run_legacy(args.results))
+            store_runs.append(run_job_store(store, args.results))
+    finally:
+        job_ids = [job_id for job_id, _, _ in legacy_runs + store_runs]
+        if job_ids:
+            get_client().table("job_results").delete().in_("job_id", job_ids).execute()
+            get_client().table("jobs").delete().in_("id", job_ids).execute()
+
+    print(f"{args.rounds} jobs with {args.results} results each\n")
+    report("Previous save path (4 requests per transition):", legacy_runs)
+    report("JobStore (1 request per transition, 2 at completion):", store_runs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: streaming row parser vs. the BeautifulSoup table path.
+Uses the checked-in page_source_0.html. Run this from the Post-Code-Scraper directory.
+"""
+
+import os
+import sys
+import timeit
+import contextlib
+
+from bs4 import BeautifulSoup
+from scraper.row_parser import parse_postcode_rows
+
+PAGE_PATH = "page_source_0.html"
+
+
+def beautifulsoup_rows(html_content):
+    """The previous path: full html.parser tree, then find_all('tr') / find_all('td')."""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    table = soup.find('table', class_='restable')
+    rows = []
+    for row in table.find_all('tr')[1:]:
+        cols = row.find_all('td')
+        if len(cols) >= 3:
+            place_name = cols[1].text.strip()
+            postcode = cols[2].text.strip()
+            if place_name and postcode:
+                rows.append((place_name, postcode))
+    return rows
+
+
+def run_benchmark(html_content, number=20):
+    # Both paths have to agree before their timings mean anything
+    expected = beautifulsoup_rows(html_content)
+    actual = parse_postcode_rows(html_content)
+    if expected != actual:
+        print("Error: the streaming parser and BeautifulSoup disagree")
+        return 1
+
+    with contextlib.redirect_stdout(None):
+        soup_time = min(timeit.repeat(lambda: beautifulsoup_rows(html_content), number=number, repeat=3)) / number
+        stream_time = min(timeit.repeat(lambda: parse_postcode_rows(html_content), number=number, repeat=3)) / number
+
+    print(f"Page: {len(html_content) / 1024:.0f} KB, {len(actual)} rows")
+    print(f"BeautifulSoup:    {soup_time * 1000:8.2f} ms/page")
+    print(f"Streaming parser: {stream_time * 1000:8.2f} ms/page")
+    print(f"Speed-up:         {soup_time / stream_time:8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    if not os.path.exists(PAGE_PATH):
+        print(f"Error: {PAGE_PATH} not found. Run this from the Post-Code-Scraper directory.")
+        sys.exit(1)
+
+    with open(PAGE_PATH, encoding="utf-8") as f:
+        page = f.read()
+    sys.exit(run_benchmark(page))
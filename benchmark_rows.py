@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: per-row dicts vs PostcodeRow records for one large state.
+
+Parses a synthetic 40k-row geonames page, then holds the rows the way a
+scrape job used to (the `data` and `results` dicts in the scraper, plus the
+"Post-Code"/"City/Town" dicts in the job) and the way it does now (the
+parsed records throughout), and reports what each keeps alive. The record
+path is also exported to CSV to check it streams without building dicts.
+Run this from the Post-Code-Scraper directory.
+
+    python benchmark_rows.py [--rows 40000]
+"""
+
+import sys
+import argparse
+import tracemalloc
+
+from scraper.row_parser import parse_postcode_rows
+from supabase_utils.export import JOB_COLUMNS, iter_export, iter_job_rows
+
+REGION_ID = 1
+
+
+def synthetic_page(row_count):
+    """A geonames-shaped page: data rows interleaved with the 2-cell coordinate rows."""
+    parts = ['<html><body><table class="restable"><tr><th></th><th>Place</th><th>Code</th><th>Country</th></tr>']
+    for i in range(row_count):
+        parts.append(f"<tr><td>{i + 1}</td><td>Synthetic Town {i % 5000}</td><td>{i:05d}</td>"
+                     f"<td>United States</td><td>Synthetic</td></tr>"
+                     f'<tr class="odd"><td colspan="2"></td><td>40.0/-75.0</td></tr>')
+    parts.append("</table></body></html>")
+    return "".join(parts)
+
+
+def legacy_job(rows):
+    """The previous path: two dicts per row in the scraper and a third in the job."""
+    postcode_rows, results = [], []
+    for place_name, postcode in rows:
+        postcode_rows.append({"code": postcode, "place_name": place_name, "region_id": REGION_ID})
+        results.append({"code": postcode, "place_name": place_name})
+    formatted_results = [{"Post-Code": item.get("code", ""), "City/Town": item.get("place_name", "")}
+                         for item in results]
+    return postcode_rows, results, formatted_results
+
+
+def record_job(rows):
+    """The current path: the parsed records are the results (a city filter only copies references)."""
+    return list(rows)
+
+
+def measure(build, rows):
+    """Returns (bytes still held by the result, peak bytes while building it)."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    held = build(rows)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return current, peak
+
+
+def export_peak(rows):
+    tracemalloc.start()
+    size = sum(len(chunk) for chunk in iter_export(iter_job_rows(rows), JOB_COLUMNS, "csv"))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=40000, help="Rows in the synthetic state")
+    args = parser.parse_args()
+
+    page = synthetic_page(args.rows)
+    records = parse_postcode_rows(page)
+    if records is None or len(records) != args.rows:
+        print(f"Error: parsed {len(records or [])} rows, expected {args.rows}")
+        return 1
+    tuples = [tuple(row) for row in records]
+
+    legacy_held, legacy_peak = measure(legacy_job, tuples)
+    record_held, record_peak = measure(record_job, records)
+    parsed_size = sum(sys.getsizeof(row) + sys.getsizeof(row.place_name) + sys.getsizeof(row.code)
+                      for row in records)
+    csv_bytes, csv_peak = export_peak(records)
+
+    mb = 1024 * 1024
+    print(f"Synthetic state: {args.rows} rows ({len(page) / mb:.1f} MB of HTML)")
+    print(f"Parsed records themselves:    {parsed_size / mb:7.2f} MB (shared by both paths)")
+    print(f"Per-row dicts (3 per row):    {legacy_held / mb:7.2f} MB held, {legacy_peak / mb:7.2f} MB peak")
+    print(f"PostcodeRow records:          {record_held / mb:7.2f} MB held, {record_peak / mb:7.2f} MB peak")
+    print(f"Saved per job:                {(legacy_held - record_held) / mb:7.2f} MB")
+    print(f"CSV export of the records:    {csv_bytes / mb:7.2f} MB written, {csv_peak / mb:7.2f} MB peak")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
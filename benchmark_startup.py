@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold start of the web app (what a gunicorn worker pays before serving).
+
+Imports `app` in fresh interpreters under `python -X importtime`, reports the
+wall time and the slowest imports, and fails when the median exceeds the
+target or a module that should load lazily was imported at startup.
+Run this from the Post-Code-Scraper directory.
+
+    python benchmark_startup.py [--runs 5] [--target-ms 1000]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+# Loaded on first use only; none of these may appear in a cold start
+DEFERRED_MODULES = ["supabase", "playwright", "pandas", "bs4", "pyarrow"]
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_app_once(queue_path):
+    env = dict(os.environ, JOB_QUEUE_PATH=queue_path, RUN_INPROCESS_WORKERS="0", PYTHONPATH=os.getcwd())
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                            env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"importing app failed:\n{result.stderr[-2000:]}")
+
+    imports = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            imports[match.group(4)] = int(match.group(2))  # cumulative microseconds
+    return elapsed, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to start")
+    parser.add_argument("--target-ms", type=float, default=float(os.environ.get("STARTUP_TARGET_MS", "1000")),
+                        help="Median wall time allowed for `import app`")
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to list")
+    args = parser.parse_args()
+
+    if not os.path.exists("app.py"):
+        print("Error: app.py not found. Run this from the Post-Code-Scraper directory.")
+        return 1
+
+    timings, imports = [], {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(args.runs):
+            elapsed, imports = import_app_once(os.path.join(tmp, "job_queue.db"))
+            timings.append(elapsed * 1000)
+
+    median = statistics.median(timings)
+    print(f"import app: median {median:.0f} ms, min {min(timings):.0f} ms, max {max(timings):.0f} ms "
+          f"over {args.runs} runs (target {args.target_ms:.0f} ms)")
+
+    top_level = {name: us for name, us in imports.items() if "." not in name}
+    print(f"\nSlowest top-level imports (last run, cumulative):")
+    for name, us in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    eager = [name for name in DEFERRED_MODULES if name in imports]
+    if eager:
+        print(f"\nError: imported at startup but meant to load lazily: {', '.join(eager)}")
+    if median > args.target_ms:
+        print(f"\nError: cold start {median:.0f} ms is over the {args.target_ms:.0f} ms target")
+    return 1 if eager or median > args.target_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
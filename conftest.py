@@ -0,0 +1,2 @@
+# test_scraper.py is an interactive script that scrapes geonames live, not a pytest module
+collect_ignore = ["test_scraper.py"]
@@ -0,0 +1,14 @@
+# Gunicorn loads ./gunicorn.conf.py automatically; command-line flags in the
+# Dockerfile still take precedence over anything set here.
+
+
+def post_worker_init(worker):
+    """Start the job workers once the app is loaded, so queued jobs resume without waiting for a request."""
+    from app import start_workers
+    start_workers()
+
+
+def worker_exit(server, worker):
+    """Close the pooled browsers before the worker process goes away."""
+    from scraper.browser_pool import shutdown_browser_pool
+    shutdown_browser_pool()
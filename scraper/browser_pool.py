@@ -0,0 +1,468 @@
+import os
+import sys
+import time
+import queue
+import random
+import atexit
+import threading
+import subprocess
+from urllib.parse import urlsplit
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+# Pool sizing and recycling, overridable per deployment
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "1"))
+BROWSER_RECYCLE_AFTER = int(os.environ.get("BROWSER_RECYCLE_AFTER", "50"))
+BROWSER_LEASE_TIMEOUT = float(os.environ.get("BROWSER_LEASE_TIMEOUT", "180"))
+# Seconds after every engine failed to launch before a lease tries launching again;
+# leases in between fail straight away instead of repeating the slow retries
+BROWSER_LAUNCH_BACKOFF = float(os.environ.get("BROWSER_LAUNCH_BACKOFF", "300"))
+
+# Request interception on each browser's context: only the listed resource types
+# from the listed hosts (and their subdomains) are fetched, everything else is aborted
+BROWSER_BLOCK_REQUESTS = os.environ.get("BROWSER_BLOCK_REQUESTS", "1") not in ("0", "false", "False")
+BROWSER_ALLOWED_RESOURCE_TYPES = set(os.environ.get("BROWSER_ALLOWED_RESOURCE_TYPES", "document,xhr,fetch").split(","))
+BROWSER_ALLOWED_HOSTS = os.environ.get("BROWSER_ALLOWED_HOSTS", "geonames.org").split(",")
+# Share of blocking leases run the old way instead (nothing blocked, then waiting for
+# the network to go idle) to measure the time per page that blocking saves
+BROWSER_BASELINE_SAMPLE_RATE = float(os.environ.get("BROWSER_BASELINE_SAMPLE_RATE", "0.05"))
+# Seconds a baseline sample may wait for the network to go idle before it is dropped
+BROWSER_BASELINE_TIMEOUT = float(os.environ.get("BROWSER_BASELINE_TIMEOUT", "5"))
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+
+class BrowserUnavailableError(RuntimeError):
+    """Raised when no browser engine could be launched."""
+
+
+def is_cloud_environment():
+    return bool(os.environ.get("CI") or os.environ.get("RENDER") or os.environ.get("DOCKER_CONTAINER"))
+
+
+def build_launch_options():
+    """Returns the Playwright launch options for the current environment."""
+    launch_options = {
+        "headless": True,  # Run in headless mode
+    }
+    if is_cloud_environment():
+        # Add CI-specific options
+        launch_options.update({
+            "args": [
+                "--no-sandbox",
+                "--disable-setuid-sandbox",
+                "--disable-dev-shm-usage",
+                "--disable-accelerated-2d-canvas",
+                "--no-first-run",
+                "--no-zygote",
+                "--single-process",
+                "--disable-gpu"
+            ]
+        })
+    return launch_options
+
+
+def is_request_allowed(resource_type, url):
+    """The interception policy: the page document and XHR/fetch calls to geonames, nothing else."""
+    if resource_type not in BROWSER_ALLOWED_RESOURCE_TYPES:
+        return False
+    host = (urlsplit(url).hostname or "").lower()
+    return any(host == allowed or host.endswith("." + allowed) for allowed in BROWSER_ALLOWED_HOSTS)
+
+
+class RequestStats:
+    """Requests one page lease let through or blocked, and how long its page took."""
+
+    def __init__(self):
+        self.allowed = 0
+        self.blocked = 0
+        self.blocked_by_type = {}
+        self.started = time.monotonic()
+        self.seconds = None
+
+    def record(self, resource_type, allowed):
+        if allowed:
+            self.allowed += 1
+            return
+        self.blocked += 1
+        self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+
+    def stop(self):
+        self.seconds = time.monotonic() - self.started
+        return self.seconds
+
+    def add_to(self, report, baseline_seconds=None):
+        """
+        Accumulates this lease into report["browser_requests"]. With
+        baseline_seconds (the pool's measured time per unblocked page), the
+        lease also counts towards seconds_saved.
+        """
+        totals = report.setdefault("browser_requests", {
+            "pages": 0, "allowed": 0, "blocked": 0, "blocked_by_type": {}, "seconds": 0.0,
+            "pages_compared": 0, "seconds_saved": 0.0, "seconds_saved_per_page": None,
+        })
+        totals["pages"] += 1
+        totals["allowed"] += self.allowed
+        totals["blocked"] += self.blocked
+        for resource_type, count in self.blocked_by_type.items():
+            totals["blocked_by_type"][resource_type] = totals["blocked_by_type"].get(resource_type, 0) + count
+        totals["seconds"] = round(totals["seconds"] + self.seconds, 3)
+        if baseline_seconds is not None:
+            totals["pages_compared"] += 1
+            totals["seconds_saved"] = round(totals["seconds_saved"] + baseline_seconds - self.seconds, 3)
+            totals["seconds_saved_per_page"] = round(totals["seconds_saved"] / totals["pages_compared"], 3)
+
+
+class PageTimings:
+    """Seconds per successful page, for leases that blocked requests and for baseline leases."""
+
+    def __init__(self):
+        self._totals = {"blocked": [0, 0.0], "baseline": [0, 0.0]}
+        self._lock = threading.Lock()
+
+    def add(self, mode, seconds):
+        with self._lock:
+            totals = self._totals[mode]
+            totals[0] += 1
+            totals[1] += seconds
+
+    def average(self, mode):
+        with self._lock:
+            pages, seconds = self._totals[mode]
+        return seconds / pages if pages else None
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                mode: {"pages": pages, "avg_seconds": round(seconds / pages, 3) if pages else None}
+                for mode, (pages, seconds) in self._totals.items()
+            }
+
+
+def ensure_browsers_installed():
+    """Installs Chromium in cloud environments. Runs once per pool, not per job."""
+    if not is_cloud_environment():
+        return
+    try:
+        print("Detected cloud environment, ensuring browsers are installed...")
+        subprocess.run(
+            [sys.executable, "-m", "playwright", "install", "chromium"],
+            check=True,
+            capture_output=True
+        )
+        print("Successfully installed Chromium browser")
+    except subprocess.CalledProcessError as e:
+        print(f"Failed to install browsers: {e.stderr.decode()}")
+        print("Will attempt to use fallback method")
+
+
+class _BrowserSlot:
+    """
+    One browser owned by one thread.
+
+    Playwright's sync API is bound to the thread that started it, so every
+    call into this slot's browser happens on its own worker thread. Jobs hand
+    it work through BrowserPool.run_with_page().
+    """
+
+    def __init__(self, pool, index):
+        self.pool = pool
+        self.index = index
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.pages_served = 0
+        self.launches = 0
+        self.requests_blocked = 0
+        self.request_stats = RequestStats()
+        self.lease_mode = "blocked"
+        self.thread = threading.Thread(target=self._run, name=f"browser-pool-{index}", daemon=True)
+
+    def _launch(self):
+        """Launches a browser, trying Chromium (with retries), then Firefox, then WebKit."""
+        if self.playwright is None:
+            from playwright.sync_api import sync_playwright
+            self.playwright = sync_playwright().start()
+
+        launch_options = build_launch_options()
+        browser = None
+        max_retries = 3
+
+        for attempt in range(1, max_retries + 1):
+            try:
+                print(f"[browser-pool-{self.index}] Attempting browser launch ({attempt}/{max_retries})...")
+                browser = self.playwright.chromium.launch(**launch_options)
+                break
+            except Exception as e:
+                print(f"Browser launch failed: {str(e)}")
+                if attempt < max_retries:
+                    print("I'll retry in 5 seconds...")
+                    time.sleep(5)
+                else:
+                    print("I've reached the maximum retries. I'll try Firefox instead...")
+
+        if browser is None:
+            for engine in (self.playwright.firefox, self.playwright.webkit):
+                try:
+                    browser = engine.launch(**launch_options)
+                    break
+                except Exception as e:
+                    print(f"{engine.name} launch failed: {str(e)}")
+
+        if browser is None:
+            self.pool.record_launch_failure()
+            raise BrowserUnavailableError("All browser engines failed to launch")
+
+        self.browser = browser
+        self.context = browser.new_context(
+            viewport={"width": 1920, "height": 1080},
+            user_agent=USER_AGENT
+        )
+        if BROWSER_BLOCK_REQUESTS:
+            self.context.route("**/*", self._route)
+        self.pages_served = 0
+        self.launches += 1
+        print(f"[browser-pool-{self.index}] Browser ready ({browser.browser_type.name}, launch #{self.launches}).")
+
+    def _route(self, route):
+        request = route.request
+        allowed = self.lease_mode != "blocked" or is_request_allowed(request.resource_type, request.url)
+        self.request_stats.record(request.resource_type, allowed)
+        if allowed:
+            route.continue_()
+        else:
+            self.requests_blocked += 1
+            route.abort("blockedbyclient")
+
+    def _report_requests(self, report, succeeded):
+        # Before the future resolves, so the caller sees the counts as soon as it resumes
+        seconds = self.request_stats.stop()
+        baseline_seconds = None
+        if succeeded and self.lease_mode == "blocked":
+            self.pool.page_timings.add("blocked", seconds)
+            baseline_seconds = self.pool.page_timings.average("baseline")
+        if report is not None:
+            self.request_stats.add_to(report, baseline_seconds)
+
+    def _measure_baseline(self, page):
+        # The old wait: nothing blocked and the network idle. Runs after the
+        # caller has its result, but holds this slot, so it is only taken
+        # while no lease is queued and for at most BROWSER_BASELINE_TIMEOUT.
+        try:
+            page.wait_for_load_state("networkidle", timeout=BROWSER_BASELINE_TIMEOUT * 1000)
+        except Exception as e:
+            print(f"[browser-pool-{self.index}] Baseline page never went idle: {e}")
+            return
+        self.pool.page_timings.add("baseline", time.monotonic() - self.request_stats.started)
+
+    def _close_browser(self):
+        for resource in (self.context, self.browser):
+            if resource is None:
+                continue
+            try:
+                resource.close()
+            except Exception as e:
+                print(f"[browser-pool-{self.index}] Error while closing browser resource: {e}")
+        self.context = None
+        self.browser = None
+
+    def is_healthy(self):
+        return self.browser is not None and self.browser.is_connected()
+
+    def _ensure_browser(self):
+        if self.browser is not None and self.pages_served >= self.pool.recycle_after:
+            print(f"[browser-pool-{self.index}] Recycling browser after {self.pages_served} pages.")
+            self._close_browser()
+        elif self.browser is not None and not self.is_healthy():
+            print(f"[browser-pool-{self.index}] Browser failed health check, relaunching.")
+            self._close_browser()
+        if self.browser is None:
+            self.pool.check_launch_backoff()
+            self._launch()
+
+    def _run(self):
+        while True:
+            task = self.pool.tasks.get()
+            if task is None:
+                break
+            fn, future, report, lease_mode = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            page = None
+            self.lease_mode = lease_mode
+            try:
+                self._ensure_browser()
+                self.request_stats = RequestStats()
+                page = self.context.new_page()
+                self.pages_served += 1
+                result = fn(page)
+            except BaseException as e:
+                if page is not None:
+                    self._report_requests(report, succeeded=False)
+                future.set_exception(e)
+            else:
+                self._report_requests(report, succeeded=True)
+                future.set_result(result)
+                if lease_mode == "baseline" and self.pool.tasks.empty():
+                    self._measure_baseline(page)
+            finally:
+                if page is not None:
+                    try:
+                        page.close()
+                    except Exception:
+                        pass
+        self._close_browser()
+        if self.playwright is not None:
+            try:
+                self.playwright.stop()
+            except Exception as e:
+                print(f"[browser-pool-{self.index}] Error while stopping Playwright: {e}")
+            self.playwright = None
+
+
+class BrowserPool:
+    """
+    Process-wide pool of long-lived browsers that scrape jobs lease pages from.
+
+    Each slot keeps one browser and one shared context alive across jobs,
+    relaunches it when it disconnects and recycles it after `recycle_after`
+    pages to bound memory growth.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, recycle_after=BROWSER_RECYCLE_AFTER,
+                 launch_backoff=BROWSER_LAUNCH_BACKOFF):
+        self.size = max(1, size)
+        self.recycle_after = max(1, recycle_after)
+        self.launch_backoff = launch_backoff
+        self.tasks = queue.Queue()
+        self.slots = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+        self._launch_failed_at = None
+        self.page_timings = PageTimings()
+
+    def record_launch_failure(self):
+        self._launch_failed_at = time.monotonic()
+
+    def check_launch_backoff(self):
+        """Raises BrowserUnavailableError while a recent launch failure is being backed off."""
+        failed_at = self._launch_failed_at
+        if failed_at is None:
+            return
+        remaining = failed_at + self.launch_backoff - time.monotonic()
+        if remaining > 0:
+            raise BrowserUnavailableError(f"Browser launch failed recently; not retrying for another {remaining:.0f}s")
+
+    def _start(self):
+        with self._lock:
+            if self._closed:
+                raise BrowserUnavailableError("Browser pool has been shut down")
+            if self._started:
+                return
+            ensure_browsers_installed()
+            self.slots = [_BrowserSlot(self, index) for index in range(self.size)]
+            for slot in self.slots:
+                slot.thread.start()
+            self._started = True
+
+    def run_with_page(self, fn, timeout=BROWSER_LEASE_TIMEOUT, report=None, block_requests=True):
+        """
+        Leases a fresh page from the pool and runs fn(page) on the browser thread.
+
+        Args:
+            fn (callable): Called with a Playwright page; its return value is passed back
+            timeout (float, optional): Seconds to wait for a free browser and for fn to finish
+            report (dict, optional): Receives the lease's request counts, page time and
+                time saved against the sampled baseline under "browser_requests" (see RequestStats)
+            block_requests (bool, optional): Apply the request filter; off for pages that
+                need their scripts, e.g. a JavaScript protection challenge
+
+        Returns:
+            Whatever fn returned. Exceptions raised by fn are re-raised here.
+        """
+        self._start()
+        self.check_launch_backoff()
+        if not (block_requests and BROWSER_BLOCK_REQUESTS):
+            lease_mode = "unblocked"
+        elif random.random() < BROWSER_BASELINE_SAMPLE_RATE:
+            lease_mode = "baseline"
+        else:
+            lease_mode = "blocked"
+        future = Future()
+        self.tasks.put((fn, future, report, lease_mode))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # A lease still waiting for a browser is dropped; one already running finishes unobserved
+            future.cancel()
+            raise
+
+    def health_check(self):
+        """Returns a summary of each slot's browser state."""
+        failed_at = self._launch_failed_at
+        return {
+            "started": self._started,
+            "pending_tasks": self.tasks.qsize(),
+            "launch_failed_seconds_ago": round(time.monotonic() - failed_at, 1) if failed_at is not None else None,
+            "page_seconds": self.page_timings.as_dict(),
+            "slots": [
+                {
+                    "index": slot.index,
+                    "healthy": slot.is_healthy(),
+                    "pages_served": slot.pages_served,
+                    "launches": slot.launches,
+                    "requests_blocked": slot.requests_blocked,
+                }
+                for slot in self.slots
+            ],
+        }
+
+    def shutdown(self, timeout=10):
+        """Closes every browser and stops Playwright. Safe to call more than once."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            started = self._started
+        if not started:
+            return
+        print("Shutting down browser pool...")
+        for _ in self.slots:
+            self.tasks.put(None)
+        for slot in self.slots:
+            slot.thread.join(timeout=timeout)
+
+
+_pool = None
+_pool_shut_down = False
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """
+    Returns the process-wide browser pool, creating it on first use.
+    Raises BrowserUnavailableError once shutdown_browser_pool() has run.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool_shut_down:
+            raise BrowserUnavailableError("Browser pool has been shut down")
+        if _pool is None:
+            _pool = BrowserPool()
+        return _pool
+
+
+def shutdown_browser_pool():
+    """
+    Shuts the process-wide pool down, e.g. from gunicorn's worker_exit hook.
+    The process is going away, so no new pool is started afterwards.
+    """
+    global _pool, _pool_shut_down
+    with _pool_lock:
+        pool, _pool = _pool, None
+        _pool_shut_down = True
+    if pool is not None:
+        pool.shutdown()
+
+
+atexit.register(shutdown_browser_pool)
@@ -0,0 +1,114 @@
+import os
+import time
+import threading
+
+# How long a state's index can answer city lookups before a fresh scrape is needed
+CITY_INDEX_TTL = float(os.environ.get("CITY_INDEX_TTL", str(6 * 3600)))
+
+NGRAM = 3
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class StateIndex:
+    """
+    In-memory place-name index for one state.
+
+    City filters have always been case-insensitive substring matches
+    ("ford" finds "Hartford"), so the index is built over character
+    trigrams: the query's trigrams narrow the candidates and a final
+    substring check keeps results identical to the old linear scan.
+    """
+
+    def __init__(self, state, rows, built_at=None):
+        self.state = state
+        self.built_at = built_at if built_at is not None else time.time()
+        self.rows = list(rows)
+        self.names = [place_name.lower() for place_name, _ in self.rows]
+        self.postings = {}
+        for row_id, name in enumerate(self.names):
+            for gram in _ngrams(name):
+                self.postings.setdefault(gram, []).append(row_id)
+
+    def is_fresh(self, ttl=CITY_INDEX_TTL):
+        return time.time() - self.built_at < ttl
+
+    def search(self, city_filter):
+        """Returns the PostcodeRow (place_name, code) rows whose place name contains city_filter."""
+        query = city_filter.lower()
+        if len(query) < NGRAM:
+            candidates = range(len(self.rows))
+        else:
+            # I intersect the shortest posting lists first
+            lists = sorted((self.postings.get(gram, []) for gram in _ngrams(query)), key=len)
+            if not lists or not lists[0]:
+                return []
+            candidates = set(lists[0])
+            for posting in lists[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    return []
+            candidates = sorted(candidates)
+        return [self.rows[i] for i in candidates if query in self.names[i]]
+
+
+class CityIndexRegistry:
+    """Thread-safe map of state name -> StateIndex."""
+
+    def __init__(self, ttl=CITY_INDEX_TTL):
+        self.ttl = ttl
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def put(self, state, rows, built_at=None):
+        index = StateIndex(state, rows, built_at)
+        with self._lock:
+            self._indexes[state] = index
+        return index
+
+    def get_fresh(self, state):
+        """Returns the state's index if it is younger than the TTL, else None."""
+        with self._lock:
+            index = self._indexes.get(state)
+        if index is not None and index.is_fresh(self.ttl):
+            return index
+        return None
+
+    def invalidate(self, state=None):
+        with self._lock:
+            if state is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(state, None)
+
+
+city_indexes = CityIndexRegistry()
+
+
+def find_city_postcodes(state, city_filter, load_fresh_rows=None):
+    """
+    Answers a city-filtered request from local data.
+
+    Args:
+        state (str): The state to search
+        city_filter (str): Case-insensitive substring of the place name
+        load_fresh_rows (callable, optional): Called with the state when no fresh index
+            is in memory; returns (rows, fetched_at) from storage, or None if the stored
+            data isn't fresh enough to serve
+
+    Returns:
+        list: PostcodeRow records like the scraper returns, or None if a scrape is needed
+    """
+    index = city_indexes.get_fresh(state)
+    if index is None and load_fresh_rows is not None:
+        loaded = load_fresh_rows(state)
+        if loaded:
+            rows, fetched_at = loaded
+            index = city_indexes.put(state, rows, built_at=fetched_at)
+            if not index.is_fresh(city_indexes.ttl):
+                return None
+    if index is None:
+        return None
+    return index.search(city_filter)
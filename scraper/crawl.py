@@ -0,0 +1,275 @@
+"""
+Bulk crawl mode: refreshes many states on one asyncio event loop.
+
+Page fetches go through a shared httpx.AsyncClient and a per-host token
+bucket, so geonames.org sees a bounded, polite request rate no matter how
+many states are queued. Parsing, database writes and browser escalations
+run in worker threads so they never block the loop.
+
+Usage:
+    python -m scraper.crawl --all
+    python -m scraper.crawl Texas California --concurrency 4 --rate 1
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scraper.browser_pool import get_browser_pool, BrowserUnavailableError
+from scraper.http_client import DEFAULT_HEADERS, HTTP_TIMEOUT, handle_page_response
+from scraper.page_cache import get_page_cache, record_cache_outcome
+from scraper.geonames_scraper import (
+    STATE_MAP,
+    GEONAMES_PAGE_CAP,
+    get_state_urls,
+    evaluate_http_page,
+    is_cacheable_page,
+    load_postcode_table,
+    discover_listing_pages,
+    merge_rows,
+    record_pagination,
+    process_postcode_rows,
+)
+
+# Defaults for a nationwide refresh
+CRAWL_CONCURRENCY = int(os.environ.get("CRAWL_CONCURRENCY", "4"))
+CRAWL_RATE = float(os.environ.get("CRAWL_RATE", "1.0"))    # requests per second per host
+CRAWL_BURST = int(os.environ.get("CRAWL_BURST", "2"))
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate, capacity):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostRateLimiter:
+    """Keeps one token bucket per host."""
+
+    def __init__(self, rate=CRAWL_RATE, burst=CRAWL_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+
+    async def acquire(self, url):
+        host = urlsplit(url).netloc
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = TokenBucket(self.rate, self.burst)
+        await bucket.acquire()
+
+
+async def fetch_page_async(client, limiter, url, report):
+    """
+    Async counterpart of http_client.fetch_page. Fresh cache hits skip both
+    the network and the rate limiter.
+    """
+    cache = get_page_cache()
+    cached = await asyncio.to_thread(cache.get, url) if cache else None
+    if cached and cached.is_fresh(cache.ttl):
+        record_cache_outcome(report, "hit")
+        return 200, cached.body
+
+    await limiter.acquire(url)
+    headers = cached.conditional_headers() if cached else {}
+    response = await client.get(url, headers=headers)
+    # The cache write runs in a thread, so it counts into its own dict first
+    page_report = {}
+    result = await asyncio.to_thread(
+        handle_page_response, url, response.status_code, response.text, response.headers,
+        cached, page_report, is_cacheable_page
+    )
+    for outcome in page_report["page_cache"]:
+        record_cache_outcome(report, outcome)
+    return result
+
+
+async def fetch_state_table(client, limiter, urls, report):
+    """
+    Async counterpart of fetch_postcode_table: HTTP first, browser on escalation.
+    Returns (rows, html_content), or (None, None).
+    """
+    reason = "no_table"
+    for url in urls:
+        try:
+            status_code, html_content = await fetch_page_async(client, limiter, url, report)
+        except Exception as e:
+            print(f"HTTP fetch failed for {url}: {e}")
+            reason = "http_error"
+            continue
+        # Parsing is CPU-bound, so it runs off the event loop
+        rows, reason = await asyncio.to_thread(evaluate_http_page, url, status_code, html_content)
+        if rows is not None:
+            report["engine"] = "http"
+            return rows, html_content
+        if reason == "protection":
+            break
+
+    print(f"Escalating to the browser engine (reason: {reason}).")
+    report["escalation_reason"] = reason
+    report["engine"] = "browser"
+    await limiter.acquire(urls[0])
+    pool = get_browser_pool()
+    return await asyncio.to_thread(pool.run_with_page,
+                                   lambda page: load_postcode_table(page, urls, report.get("capture_label")),
+                                   report=report, block_requests=reason != "protection")
+
+
+async def fetch_listing_page(client, limiter, url, report):
+    status_code, html_content = await fetch_page_async(client, limiter, url, report)
+    rows, reason = await asyncio.to_thread(evaluate_http_page, url, status_code, html_content)
+    if rows is None:
+        raise RuntimeError(f"no postcode table on {url} ({reason})")
+    return rows
+
+
+async def collect_state_rows(state, client, limiter, rows, html_content, report):
+    """Async counterpart of collect_paginated_rows; listing pages share the crawl's client and limiter."""
+    if len(rows) < GEONAMES_PAGE_CAP or not html_content:
+        record_pagination(report, 1, [len(rows)], [])
+        return rows
+
+    page_urls = discover_listing_pages(html_content, STATE_MAP[state]["abbr"])
+    if not page_urls:
+        record_pagination(report, 1, [len(rows)], [])
+        return rows
+    outcomes = await asyncio.gather(
+        *(fetch_listing_page(client, limiter, url, report) for url in page_urls), return_exceptions=True
+    )
+    page_rows = [outcome for outcome in outcomes if not isinstance(outcome, BaseException)]
+    failed_pages = [url for url, outcome in zip(page_urls, outcomes) if isinstance(outcome, BaseException)]
+    record_pagination(report, 1 + len(page_urls), [len(r) for r in page_rows], failed_pages)
+    return merge_rows(rows, *page_rows)
+
+
+async def crawl_state(state, client, limiter, semaphore):
+    """Scrapes one state and returns its summary entry."""
+    report = {"capture_label": state}
+    summary = {"status": "failed", "results_count": 0, "engine": None, "message": None}
+    async with semaphore:
+        started = time.monotonic()
+        try:
+            urls = get_state_urls(state)
+            if not urls:
+                summary["message"] = f"State '{state}' not found in STATE_MAP"
+                return summary
+            rows, html_content = await fetch_state_table(client, limiter, urls, report)
+            if rows is None:
+                summary["message"] = "Postcode table not found"
+                return summary
+            rows = await collect_state_rows(state, client, limiter, rows, html_content, report)
+            results = await asyncio.to_thread(process_postcode_rows, state, rows, None, report)
+            if results is None:
+                summary["message"] = "Could not create country/region entries"
+                return summary
+            summary["status"] = "completed"
+            summary["results_count"] = len(results)
+            summary["db_inserted"] = report.get("db_inserted", 0)
+            summary["db_recent"] = report.get("db_recent", [])
+            summary["db_deleted"] = report.get("db_deleted", 0)
+            summary["changes"] = report.get("changes")
+            summary["timings"] = report.get("timings")
+            summary["browser_requests"] = report.get("browser_requests")
+        except BrowserUnavailableError as e:
+            summary["message"] = str(e)
+        except Exception as e:
+            print(f"Crawl of {state} failed: {e}")
+            summary["message"] = str(e)
+        finally:
+            summary["engine"] = report.get("engine")
+            summary["pages"] = report.get("pages")
+            summary["elapsed"] = round(time.monotonic() - started, 2)
+    return summary
+
+
+async def crawl_states(states, concurrency=CRAWL_CONCURRENCY, rate=CRAWL_RATE, burst=CRAWL_BURST,
+                       on_progress=None):
+    """
+    Scrapes many states concurrently.
+
+    Args:
+        states (list): State names from STATE_MAP
+        concurrency (int): Maximum number of states processed at the same time
+        rate (float): Requests per second allowed per host
+        burst (int): Token bucket capacity per host
+        on_progress (callable, optional): Called as on_progress(state, summary) after each
+            state, in a worker thread; calls for different states may overlap
+
+    Returns:
+        dict: State name -> summary dict
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    limiter = HostRateLimiter(rate, burst)
+    limits = httpx.Limits(max_connections=max(1, concurrency), max_keepalive_connections=max(1, concurrency))
+    summaries = {}
+
+    async with httpx.AsyncClient(headers=DEFAULT_HEADERS, timeout=HTTP_TIMEOUT,
+                                 follow_redirects=True, limits=limits) as client:
+        async def run(state):
+            summary = await crawl_state(state, client, limiter, semaphore)
+            summaries[state] = summary
+            print(f"Crawl: {state} {summary['status']} ({summary['results_count']} postcodes, "
+                  f"engine={summary['engine']}, {summary.get('elapsed')}s)")
+            if on_progress:
+                # Callbacks write to the database, so they run off the loop like every other write
+                await asyncio.to_thread(on_progress, state, summary)
+
+        await asyncio.gather(*(run(state) for state in states))
+    return summaries
+
+
+def run_crawl(states, **kwargs):
+    """Blocking entry point for threads and the CLI."""
+    return asyncio.run(crawl_states(states, **kwargs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh postcodes for many states at once.")
+    parser.add_argument("states", nargs="*", help="State names, e.g. Texas \"New York\"")
+    parser.add_argument("--all", action="store_true", help="Crawl every state in STATE_MAP")
+    parser.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=CRAWL_RATE, help="Requests per second per host")
+    parser.add_argument("--burst", type=int, default=CRAWL_BURST)
+    args = parser.parse_args(argv)
+
+    states = list(STATE_MAP) if args.all else args.states
+    if not states:
+        parser.error("give at least one state or --all")
+    unknown = [state for state in states if state not in STATE_MAP]
+    if unknown:
+        parser.error(f"unknown states: {', '.join(unknown)}")
+
+    started = time.monotonic()
+    summaries = run_crawl(states, concurrency=args.concurrency, rate=args.rate, burst=args.burst)
+    completed = [s for s in summaries.values() if s["status"] == "completed"]
+    print(f"\nCrawled {len(states)} states in {time.monotonic() - started:.1f}s: "
+          f"{len(completed)} completed, {len(states) - len(completed)} failed, "
+          f"{sum(s['results_count'] for s in completed)} postcodes.")
+    return 0 if len(completed) == len(states) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import os
+import re
+import time
+import queue
+import random
+import threading
+
+# What page visits leave on disk: "off", "on-error" (pages without a postcode
+# table, failed visits) or "sampled" (errors plus DEBUG_CAPTURE_SAMPLE_RATE of the rest)
+DEBUG_CAPTURE_MODE = os.environ.get("DEBUG_CAPTURE_MODE", "off").lower()
+DEBUG_CAPTURE_SAMPLE_RATE = float(os.environ.get("DEBUG_CAPTURE_SAMPLE_RATE", "0.01"))
+DEBUG_CAPTURE_DIR = os.environ.get("DEBUG_CAPTURE_DIR", "debug_output")
+# Oldest captures are deleted once the directory holds more than this
+DEBUG_CAPTURE_MAX_BYTES = int(os.environ.get("DEBUG_CAPTURE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Captures waiting for the writer; further ones are dropped rather than slowing a scrape down
+DEBUG_CAPTURE_QUEUE = int(os.environ.get("DEBUG_CAPTURE_QUEUE", "16"))
+
+CAPTURE_MODES = ("off", "on-error", "sampled")
+
+# Retention only ever touches files named like a capture
+CAPTURE_FILE = re.compile(r"^\d{8}-\d{6}_.+\.(html|png)$")
+
+
+def _safe_name(text):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", text)[:80].strip("_") or "page"
+
+
+class DebugCapture:
+    """
+    Saves page HTML and screenshots for debugging, off the scraping thread.
+
+    wants() decides per page visit whether it is worth keeping, so a scrape
+    that captures nothing pays nothing, not even the screenshot. capture()
+    only queues the bytes; a background thread writes them under per-job
+    file names (<time>_<job>_<seq>_<reason>.html/.png) and then deletes the
+    oldest captures until the directory fits max_bytes.
+    """
+
+    def __init__(self, mode=DEBUG_CAPTURE_MODE, sample_rate=DEBUG_CAPTURE_SAMPLE_RATE, directory=DEBUG_CAPTURE_DIR,
+                 max_bytes=DEBUG_CAPTURE_MAX_BYTES, queue_size=DEBUG_CAPTURE_QUEUE):
+        if mode not in CAPTURE_MODES:
+            print(f"Unknown DEBUG_CAPTURE_MODE '{mode}'; capturing nothing.")
+            mode = "off"
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self.captured = 0
+        self.dropped = 0
+        self.deleted = 0
+
+    def wants(self, failed=False):
+        """Whether a page visit (failed or not) should be captured in the current mode."""
+        if self.mode == "off":
+            return False
+        if failed:
+            return True
+        return self.mode == "sampled" and random.random() < self.sample_rate
+
+    def capture(self, label, reason, html=None, screenshot=None):
+        """
+        Queues a page's HTML (str) and/or screenshot (PNG bytes) for writing.
+        label names the job (or state) the page belongs to; reason says why it was kept.
+        """
+        with self._lock:
+            self._sequence += 1
+            stem = (f"{time.strftime('%Y%m%d-%H%M%S')}_{_safe_name(label or 'scrape')}_"
+                    f"{self._sequence}_{_safe_name(reason)}")
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="debug-capture", daemon=True)
+                self._writer.start()
+        files = []
+        if html is not None:
+            files.append((f"{stem}.html", html.encode("utf-8")))
+        if screenshot is not None:
+            files.append((f"{stem}.png", screenshot))
+        try:
+            self._queue.put_nowait(files)
+        except queue.Full:
+            self.dropped += 1
+            return
+        print(f"Debug capture queued: {os.path.join(self.directory, stem)}.*")
+
+    def _write_loop(self):
+        while True:
+            files = self._queue.get()
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                for name, data in files:
+                    path = os.path.join(self.directory, name)
+                    tmp_path = f"{path}.tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp_path, path)
+                self.captured += 1
+                self._enforce_retention()
+            except OSError as e:
+                print(f"Writing debug capture failed: {e}")
+
+    def _enforce_retention(self):
+        captures = []
+        for name in os.listdir(self.directory):
+            if not CAPTURE_FILE.match(name):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            captures.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in captures)
+        for _, size, path in sorted(captures):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.deleted += 1
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "queued": self._queue.qsize(),
+            "captured": self.captured,
+            "dropped": self.dropped,
+            "deleted": self.deleted,
+        }
+
+
+debug_capture = DebugCapture()
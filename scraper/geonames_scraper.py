@@ -1,12 +1,26 @@
 import time
 import os
+import re
 import sys
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add parent directory to sys.path to allow importing supabase_utils
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from supabase_utils.db_client import insert_and_get_id, insert_postcode_data, get_id_by_column
+from scraper.browser_pool import get_browser_pool, BrowserUnavailableError
+from scraper.http_client import fetch_page
+from scraper.page_cache import get_page_cache
+from scraper.row_parser import parse_postcode_rows
+from scraper.city_index import city_indexes
+from scraper.debug_capture import debug_capture
+from scraper.pipeline import RowPipeline, StageTimings
+from supabase_utils.id_cache import location_ids
+
+# geonames shows at most this many rows on one listing page
+GEONAMES_PAGE_CAP = 200
+# Listing pages fetched in parallel when a state spans several pages
+PAGE_FETCH_CONCURRENCY = int(os.environ.get("SCRAPER_PAGE_CONCURRENCY", "6"))
+# Seconds a browser page is given to render the postcode table
+BROWSER_TABLE_TIMEOUT = float(os.environ.get("BROWSER_TABLE_TIMEOUT", "15"))
 
 # --- State Mapping ---
 # (Add more states as needed)
@@ -64,23 +78,32 @@ STATE_MAP = {
 }
 
 
-def check_for_protection(page):
-    """Checks if the current page seems to be a protection/captcha page."""
-    protection_indicators = [
-        "captcha",
-        "security check",
-        "verify you're human",
-        "cloudflare"
-    ]
-    
-    page_text = page.content().lower()
-    for indicator in protection_indicators:
+PROTECTION_INDICATORS = [
+    "captcha",
+    "security check",
+    "verify you're human",
+    "cloudflare"
+]
+
+def is_protection_html(html_content):
+    """Checks if an HTML document seems to be a protection/captcha page."""
+    page_text = html_content.lower()
+    for indicator in PROTECTION_INDICATORS:
         if indicator in page_text:
             return True
     return False
 
+def check_for_protection(page):
+    """Checks if the current page seems to be a protection/captcha page."""
+    return is_protection_html(page.content())
+
+def is_cacheable_page(html_content):
+    """Only real postcode listings go into the page cache, never captcha pages."""
+    return "restable" in html_content and not is_protection_html(html_content)
+
 def find_postcode_table(html_content):
     """Finds the table containing postal codes in the HTML content."""
+    from bs4 import BeautifulSoup  # only this legacy path needs it
     soup = BeautifulSoup(html_content, 'html.parser')
     tables = soup.find_all('table')
     print(f"Found {len(tables)} tables on the page.")
@@ -98,252 +121,219 @@ def find_postcode_table(html_content):
     print("\nCould not find a suitable postcode table.")
     return None
 
-def scrape_geonames_postcodes(state, city_filter=None):
+def load_postcode_table(page, urls, label=None):
+    """
+    Visits each URL with a pooled browser page until one contains the postcode table.
+    Runs on the browser pool's thread.
+
+    Args:
+        page: Playwright page leased from the browser pool
+        urls (list): Candidate URLs, tried in order
+        label (str, optional): Names the job in debug capture files (see debug_capture)
+
+    Returns:
+        tuple: (rows, html_content) - the table's (place_name, code) pairs and the
+        page they came from, or (None, None) if no URL had the table
+    """
+    for url in urls:
+        print(f"\nI'm trying the URL: {url}")
+        html_content = None
+        
+        try:
+            # I navigate to the URL with retry logic
+            for nav_attempt in range(3):
+                try:
+                    page.goto(url, timeout=60000, wait_until="domcontentloaded")
+                    break
+                except Exception as nav_error:
+                    print(f"Navigation attempt {nav_attempt + 1} failed: {nav_error}")
+                    if nav_attempt < 2: # Use '<' for correct retry count
+                        print("I'll retry navigation...")
+                        time.sleep(2)
+                    else:
+                        raise
+            
+            # I wait for the postcode table itself, not for the network to go quiet
+            try:
+                page.wait_for_selector("table.restable", timeout=BROWSER_TABLE_TIMEOUT * 1000)
+            except Exception:
+                print(f"No postcode table appeared within {BROWSER_TABLE_TIMEOUT:.0f}s.")
+            
+            # I print page info for debugging
+            print(f"Page title: {page.title()}")
+            print(f"Current URL: {page.url}")
+            
+            # Nobody is at a console to solve a captcha, so the page counts as failed
+            if check_for_protection(page):
+                raise RuntimeError("the browser was shown a protection page")
+            
+            # I find the postal code table
+            html_content = page.content()
+            rows = parse_postcode_rows(html_content)
+            
+            # Pages are only written to debug_output when the capture mode asks for them
+            if debug_capture.wants(failed=rows is None):
+                debug_capture.capture(label, "no_table" if rows is None else "sampled",
+                                      html_content, page.screenshot())
+            
+            if rows is not None:
+                # I cache what the browser fetched so the next job can skip it
+                cache = get_page_cache()
+                if cache and is_cacheable_page(html_content):
+                    cache.put(url, html_content)
+                return rows, html_content
+                
+        except Exception as e:
+            print(f"Error processing URL {url}: {e}")
+            if debug_capture.wants(failed=True):
+                capture_failed_page(page, label, html_content)
+            continue
+    return None, None
+
+def capture_failed_page(page, label, html_content=None):
+    """Best-effort debug capture of a page whose visit raised; the page may be unusable by now."""
+    try:
+        html_content = html_content if html_content is not None else page.content()
+        screenshot = page.screenshot()
+    except Exception as e:
+        print(f"Could not capture the failed page: {e}")
+        screenshot = None
+    debug_capture.capture(label, "error", html_content, screenshot)
+
+def fetch_with_http(urls, report=None):
+    """
+    Tries each URL with the pooled HTTP client, going through the page cache.
+
+    Returns:
+        tuple: (rows, html_content, reason) - the postcode rows and their page, or
+        None and the reason the browser should take over ("protection",
+        "no_table" or "http_error")
+    """
+    reason = "no_table"
+    for url in urls:
+        print(f"\nI'm fetching the URL over HTTP: {url}")
+        try:
+            status_code, html_content = fetch_page(url, report, cacheable=is_cacheable_page)
+        except Exception as e:
+            print(f"HTTP fetch failed for {url}: {e}")
+            reason = "http_error"
+            continue
+        rows, reason = evaluate_http_page(url, status_code, html_content)
+        if rows is not None or reason == "protection":
+            return rows, html_content, reason
+    return None, None, reason
+
+def evaluate_http_page(url, status_code, html_content):
+    """
+    Decides whether an HTTP response is usable or the browser has to take over.
+    Shared by the sync engine selector and the async crawl scheduler.
+
+    Returns:
+        tuple: (rows, reason) - the postcode rows, or None and the escalation reason
+    """
+    if status_code != 200:
+        print(f"HTTP fetch returned status code {status_code} for {url}")
+        return None, "http_error"
+    if is_protection_html(html_content):
+        # The browser is the only engine that can get past a protection page
+        print("I detected a protection page over HTTP.")
+        return None, "protection"
+    rows = parse_postcode_rows(html_content)
+    if rows is not None:
+        return rows, None
+    return None, "no_table"
+
+def fetch_postcode_table(urls, report=None):
+    """
+    Engine selector: plain HTTP first, escalating to the browser pool only when
+    the HTTP response is a protection page or has no postcode table.
+
+    Args:
+        urls (list): Candidate URLs, tried in order
+        report (dict, optional): Receives "engine" and, on escalation, "escalation_reason"
+            and "browser_requests" (see BrowserPool.run_with_page);
+            its "capture_label", if set, names any debug captures
+
+    Returns:
+        tuple: (rows, html_content), or (None, None) if no engine found the table
+    """
+    if report is None:
+        report = {}
+
+    rows, html_content, reason = fetch_with_http(urls, report)
+    if rows is not None:
+        report["engine"] = "http"
+        return rows, html_content
+
+    print(f"Escalating to the browser engine (reason: {reason}).")
+    report["escalation_reason"] = reason
+    report["engine"] = "browser"
+    # A protection page may be a JavaScript challenge, which can only pass with its scripts loaded
+    return get_browser_pool().run_with_page(lambda page: load_postcode_table(page, urls, report.get("capture_label")),
+                                            report=report, block_requests=reason != "protection")
+
+def scrape_geonames_postcodes(state, city_filter=None, report=None, on_progress=None):
     """
     Scrape postal codes from geonames.org for a given US state
     
     Args:
         state (str): The state to scrape postal codes for
         city_filter (str, optional): Filter results by city name
+        report (dict, optional): Filled with job metadata such as the engine that served the page
+        on_progress (callable, optional): Called with a dict of row counts as pages are
+            fetched ("stage": "fetching") and rows are written ("stage": "storing")
+        
+    Fetching, parsing and database writes overlap (see RowPipeline); the seconds
+    spent in each stage end up in report["timings"].
         
     Returns:
-        list: List of dictionaries with postcode data
+        list: PostcodeRow (place_name, code) records; empty only when the
+        scrape succeeded and found no rows
+    
+    Raises:
+        Exception: Whatever stopped the scrape (no postcode table, a failed
+        fetch, load or write), so the job fails instead of completing empty
     """
+    if report is None:
+        report = {}
+    started = time.perf_counter()
+    timings = StageTimings()
     try:
-        # Initialize results list
-        results = []
-        
-        print("I'm initializing Playwright...")
-        from playwright.sync_api import sync_playwright
-        import subprocess
-        import sys
-        
-        # Check if we're in a cloud environment and install browsers if needed
-        if os.environ.get("CI") or os.environ.get("RENDER") or os.environ.get("DOCKER_CONTAINER"):
-            try:
-                print("Detected cloud environment, ensuring browsers are installed...")
-                # Install browsers directly using subprocess
-                subprocess.run(
-                    [sys.executable, "-m", "playwright", "install", "chromium"],
-                    check=True,
-                    capture_output=True
-                )
-                print("Successfully installed Chromium browser")
-            except subprocess.CalledProcessError as e:
-                print(f"Failed to install browsers: {e.stderr.decode()}")
-                print("Will attempt to use fallback method")
-        
-        # Initialize Playwright
-        p = sync_playwright().start()
-        
-        # Set up browser launch options
-        launch_options = {
-            "headless": True,  # Run in headless mode
-        }
-        
-        # Try to detect if we're running in a CI/CD environment
-        if os.environ.get("CI") or os.environ.get("RENDER") or os.environ.get("DOCKER_CONTAINER"):
-            # Add CI-specific options
-            launch_options.update({
-                "args": [
-                    "--no-sandbox",
-                    "--disable-setuid-sandbox",
-                    "--disable-dev-shm-usage",
-                    "--disable-accelerated-2d-canvas",
-                    "--no-first-run",
-                    "--no-zygote",
-                    "--single-process",
-                    "--disable-gpu"
-                ]
-            })
-        
-        # Try to launch browsers with multiple retries
-        browser = None
-        max_retries = 3
-        
-        # Try Chromium first
-        for attempt in range(1, max_retries + 1):
-            try:
-                print(f"Attempting browser launch ({attempt}/{max_retries})...")
-                browser = p.chromium.launch(**launch_options)
-                break
-            except Exception as e:
-                print(f"Browser launch failed: {str(e)}")
-                if attempt < max_retries:
-                    print(f"I'll retry in 5 seconds...")
-                    time.sleep(5)
-                else:
-                    print(f"I've reached the maximum retries. I'll try Firefox instead...")
-        
-        # If Chromium failed, try Firefox
-        if browser is None:
-            try:
-                browser = p.firefox.launch(**launch_options)
-            except Exception as e:
-                print(f"Firefox launch failed: {str(e)}")
-                print(f"I'll try Webkit as a last resort...")
-                try:
-                    browser = p.webkit.launch(**launch_options)
-                except Exception as e:
-                    print(f"Webkit launch failed: {str(e)}")
-                    # If all browser engines fail, try a fallback method
-                    print("All browser engines failed. Using fallback method...")
-                    return fallback_scraper(state, city_filter)
-        
-        # Create a context with retry logic
-        try:
-            context = browser.new_context(
-                viewport={"width": 1920, "height": 1080},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            )
-            page = context.new_page()
-            print("Browser context and page created successfully.")
-        except Exception as e:
-            print(f"Failed to create context or page: {e}")
-            if browser:
-                browser.close()
-            raise
-        
-        # Get state details from map
-        state_details = STATE_MAP.get(state)
-        if not state_details:
+        urls = get_state_urls(state)
+        if not urls:
             print(f"Error: State '{state}' not found in STATE_MAP.")
-            browser.close()
             return
         
-        state_abbr = state_details["abbr"]
-        state_slug = state_details["slug"]
-        
-        # Construct URLs dynamically
-        urls = [
-            f"https://www.geonames.org/postal-codes/US/{state_abbr}/{state_slug}.html",
-            f"https://www.geonames.org/postal-codes/US/{state_abbr}/"
-        ]
-        
-        postal_table = None
-        for url in urls:
-            print(f"\nI'm trying the URL: {url}")
-            
-            try:
-                # I navigate to the URL with retry logic
-                for nav_attempt in range(3):
-                    try:
-                        page.goto(url, timeout=60000, wait_until="domcontentloaded")
-                        break
-                    except Exception as nav_error:
-                        print(f"Navigation attempt {nav_attempt + 1} failed: {nav_error}")
-                        if nav_attempt < 2: # Use '<' for correct retry count
-                            print("I'll retry navigation...")
-                            time.sleep(2)
-                        else:
-                            raise
-                
-                # I wait for the page to stabilize
-                page.wait_for_load_state("networkidle", timeout=30000)
-                
-                # I print page info for debugging
-                print(f"Page title: {page.title()}")
-                print(f"Current URL: {page.url}")
-                
-                # I check for protection/captcha
-                if check_for_protection(page): # Consider removing input for automated runs
-                    print("\nI detected a protection page. Please solve the captcha if present.")
-                    input("Press Enter once you've solved the captcha...")
-                    time.sleep(2)  # I wait after the captcha
-                
-                # I save the page source for debugging
-                html_content = page.content()
-                debug_dir = "debug_output"
-                os.makedirs(debug_dir, exist_ok=True)
-                with open(f"{debug_dir}/page_source_{urls.index(url)}.html", "w", encoding="utf-8") as f:
-                    f.write(html_content)
-                print(f"Page source saved to '{debug_dir}/page_source_{urls.index(url)}.html'")
-                
-                # I take a screenshot for debugging
-                page.screenshot(path=f"{debug_dir}/screenshot_{urls.index(url)}.png")
-                print(f"Screenshot saved to '{debug_dir}/screenshot_{urls.index(url)}.png'")
-                
-                # I find the postal code table
-                postal_table = find_postcode_table(html_content)
-                if postal_table:
-                    break  # I exit the URL loop if I find the table
-                    
-            except Exception as e:
-                print(f"Error processing URL {url}: {e}")
-                continue
-        
-        if not postal_table:
+        # I try plain HTTP first and only lease a browser page when that isn't enough
+        try:
+            with timings.time("fetch"):
+                rows, html_content = fetch_postcode_table(urls, report)
+        except BrowserUnavailableError as e:
+            print(f"{e}. Using fallback method...")
+            report["engine"] = "fallback"
+            return fallback_scraper(state, city_filter, label=report.get("capture_label"))
+        
+        if rows is None:
             print("\nI couldn't find the postal code table in any of the URLs.")
-            browser.close()
-            return
-            
-        print(f"\nPostcode table found for {state}. Processing data...")
-        
-        # I get or create the country using improved database functions
-        country_id = get_id_by_column("countries", "name", "USA")
-        if country_id is None:
-            print("I'm creating a USA country entry...")
-            country_id = insert_and_get_id("countries", {"name": "USA", "code": "US"}, "name")
-            if country_id is None:
-                print("I failed to create the country entry. I'm aborting.")
-                browser.close()
-                return
-        
-        # I get or create the region
-        region_id = get_id_by_column("regions", "name", state, country_id=country_id)
-        if region_id is None:
-            print(f"Creating {state} region entry...")
-            region_id = insert_and_get_id("regions", {"name": state, "code": state_abbr, "country_id": country_id}, "name")
-            if region_id is None:
-                print("Failed to create region entry. Aborting.")
-                browser.close()
-                return
-        
-        # I process the rows
-        rows = postal_table.find_all("tr")[1:]  # I skip the header
-        success_count = 0
-        error_count = 0
-        
-        for row in rows:
-            cols = row.find_all("td")
-            if len(cols) >= 3:  # I ensure there are at least 3 columns
-                place_name = cols[1].text.strip() # Second column is the place name (e.g., "Avon")
-                postcode = cols[2].text.strip()   # Third column is the postal code (e.g., "06001")
-
-                # Apply city filter if provided
-                if city_filter and city_filter.lower() not in place_name.lower():
-                    continue # Skip this row if city doesn't match
-
-                if place_name and postcode:
-                    print(f"Processing: {place_name} - {postcode}")
-                    data = {
-                        "code": postcode,
-                        "place_name": place_name,
-                        "region_id": region_id,
-                    }
-                    
-                    # Add to results list
-                    results.append({
-                        "code": postcode,
-                        "place_name": place_name
-                    })
-                    
-                    if insert_postcode_data(data):
-                        success_count += 1
-                    else:
-                        error_count += 1
-            else:
-                print(f"Skipping row, expected 3+ columns, found {len(cols)}.")
-        
-        # --- This block should be OUTSIDE the loop ---
-        print(f"\nScraping completed for {state}" + (f" (City: {city_filter})" if city_filter else "") + ":")
-        print(f"Successfully processed/inserted: {success_count} postcodes.")
-        print(f"Errors encountered: {error_count} postcodes.")
-        print(f"Total results in list: {len(results)}")
-        
-        browser.close()
-        
-        # Return the results list
+            raise RuntimeError(f"No postcode table found for {state}")
+        if on_progress:
+            on_progress({"stage": "fetching", "rows_found": len(rows), "pages_done": 1})
+        
+        # Rows are written while the county listing pages (the rows the first page
+        # couldn't hold) are still being fetched
+        pipeline = open_state_pipeline(state, city_filter, on_progress, timings)
+        if pipeline is None:
+            raise RuntimeError(f"Could not create the country/region entries for {state}")
+        pipeline.put(rows)
+        try:
+            collect_paginated_rows(state, rows, html_content, report, on_progress,
+                                   on_page=pipeline.put, timings=timings)
+        except Exception:
+            # I let the writes already queued land, but never delete after a failed fetch
+            pipeline.finish(complete=False)
+            raise
+        results = finish_state_pipeline(state, pipeline, city_filter, report)
+        report["timings"]["total"] = round(time.perf_counter() - started, 3)
         return results
         
     except Exception as e:
@@ -351,25 +341,242 @@ def scrape_geonames_postcodes(state, city_filter=None):
         print(f"Error type: {type(e)}")
         import traceback
         print(f"Traceback: {traceback.format_exc()}")
-        return []  # Return empty list on error
+        raise
+
+def get_state_urls(state):
+    """Returns the geonames URLs to try for a state, or None if the state is unknown."""
+    state_details = STATE_MAP.get(state)
+    if not state_details:
+        return None
+    
+    state_abbr = state_details["abbr"]
+    state_slug = state_details["slug"]
+    
+    # Construct URLs dynamically
+    return [
+        f"https://www.geonames.org/postal-codes/US/{state_abbr}/{state_slug}.html",
+        f"https://www.geonames.org/postal-codes/US/{state_abbr}/"
+    ]
+
+def discover_listing_pages(html_content, state_abbr):
+    """
+    Finds the county listing pages linked from a state page.
+    geonames caps the state page at GEONAMES_PAGE_CAP rows; the per-county
+    pages (e.g. /postal-codes/US/CT/001/fairfield.html) together cover the rest.
+    """
+    pattern = re.compile(r'href="(/postal-codes/US/' + re.escape(state_abbr) + r'/\d+/[^"]+\.html)"')
+    paths = dict.fromkeys(pattern.findall(html_content))  # I keep page order and drop repeats
+    return [f"https://www.geonames.org{path}" for path in paths]
+
+def fetch_listing_page(url, report=None, timings=None):
+    """Fetches one listing page over the pooled HTTP client (and page cache) and returns its rows."""
+    timings = timings or StageTimings()
+    with timings.time("fetch"):
+        status_code, html_content = fetch_page(url, report, cacheable=is_cacheable_page)
+    with timings.time("parse"):
+        rows, reason = evaluate_http_page(url, status_code, html_content)
+    if rows is None:
+        raise RuntimeError(f"no postcode table on {url} ({reason})")
+    return rows
+
+def merge_rows(*row_lists):
+    """Merges row lists, keeping the first place name seen for each code."""
+    merged = {}
+    for rows in row_lists:
+        for row in rows:
+            merged.setdefault(row.code, row)
+    return list(merged.values())
+
+def record_pagination(report, pages, page_row_counts, failed_pages):
+    report["pages"] = pages
+    report["pages_failed"] = failed_pages
+    # A county page at the cap is itself truncated and can't be paged further
+    report["pages_at_cap"] = sum(1 for count in page_row_counts if count >= GEONAMES_PAGE_CAP)
+
+def pagination_complete(report):
+    """Whether record_pagination ran and every page it recorded was read in full."""
+    return "pages_at_cap" in report and not report["pages_failed"] and not report["pages_at_cap"]
+
+def collect_paginated_rows(state, first_page_rows, html_content, report, on_progress=None, on_page=None,
+                           timings=None):
+    """
+    Completes a state's rows when its first page was truncated.
+    Listing pages are fetched concurrently over the shared HTTP connection pool.
+    on_progress, if given, is called after each listing page (see scrape_geonames_postcodes).
+    on_page, if given, is called by the fetching thread with each listing page's
+    rows as soon as they are parsed, e.g. RowPipeline.put.
+    
+    Returns:
+        list: De-duplicated (place_name, code) pairs
+    """
+    # A first page at the cap with nothing to page through stays truncated
+    if len(first_page_rows) < GEONAMES_PAGE_CAP or not html_content:
+        record_pagination(report, 1, [len(first_page_rows)], [])
+        return first_page_rows
+    
+    page_urls = discover_listing_pages(html_content, STATE_MAP[state]["abbr"])
+    if not page_urls:
+        record_pagination(report, 1, [len(first_page_rows)], [])
+        return first_page_rows
+    
+    print(f"First page of {state} hit the {GEONAMES_PAGE_CAP}-row cap. Fetching {len(page_urls)} listing pages...")
+    page_rows = []
+    failed_pages = []
+    page_reports = [{} for _ in page_urls]
+    def fetch_and_hand_on(url, page_report):
+        rows = fetch_listing_page(url, page_report, timings)
+        if on_page:
+            on_page(rows)
+        return rows
+    
+    with ThreadPoolExecutor(max_workers=min(PAGE_FETCH_CONCURRENCY, len(page_urls))) as executor:
+        futures = {
+            executor.submit(fetch_and_hand_on, url, page_report): url
+            for url, page_report in zip(page_urls, page_reports)
+        }
+        for future in as_completed(futures):
+            try:
+                page_rows.append(future.result())
+            except Exception as e:
+                print(f"Listing page fetch failed: {e}")
+                failed_pages.append(futures[future])
+            if on_progress:
+                # Listing pages overlap the first page, so this is an upper bound until the merge
+                on_progress({"stage": "fetching", "rows_found": len(first_page_rows) + sum(map(len, page_rows)),
+                             "pages_done": 1 + len(page_rows) + len(failed_pages), "pages_total": 1 + len(page_urls)})
+    
+    # Each worker counted its own cache outcomes; I fold them into the job report
+    cache_counts = report.setdefault("page_cache", {})
+    for page_report in page_reports:
+        for outcome, count in page_report.get("page_cache", {}).items():
+            cache_counts[outcome] = cache_counts.get(outcome, 0) + count
+    
+    rows = merge_rows(first_page_rows, *page_rows)
+    record_pagination(report, 1 + len(page_urls), [len(r) for r in page_rows], failed_pages)
+    print(f"Merged {len(rows)} unique postcodes from {1 + len(page_rows)} pages.")
+    return rows
+
+def process_postcode_rows(state, rows, city_filter=None, report=None, on_progress=None):
+    """
+    Writes a state's postcode rows to the database.
+    
+    Only the difference from what the region already stores is written (see
+    RowPipeline); report["changes"] summarises it, so refreshing an unchanged
+    state costs one read and no writes.
+    
+    Args:
+        state (str): The state the rows belong to
+        rows (list): PostcodeRow (place_name, code) records
+        city_filter (str, optional): Filter results by city name
+        report (dict, optional): Job metadata, see scrape_geonames_postcodes
+        on_progress (callable, optional): Called after each written chunk, see scrape_geonames_postcodes
+        
+    Returns:
+        list: The PostcodeRow records stored, or None if the country/region
+        entries could not be created
+    """
+    if report is None:
+        report = {}
+    pipeline = open_state_pipeline(state, city_filter, on_progress)
+    if pipeline is None:
+        return
+    pipeline.put(rows)
+    return finish_state_pipeline(state, pipeline, city_filter, report)
+
+def open_state_pipeline(state, city_filter=None, on_progress=None, timings=None):
+    """
+    Starts the database side of a state's scrape: pages handed to the returned
+    RowPipeline are diffed and written while later pages are still fetched.
+    
+    Returns:
+        RowPipeline: Or None if the country/region entries could not be created
+    """
+    state_abbr = STATE_MAP[state]["abbr"]
+    
+    print(f"\nPostcode table found for {state}. Processing data...")
+    
+    # Country and region ids come from the in-process id cache, created on first use
+    country_id = location_ids.country_id("USA", code="US")
+    if country_id is None:
+        print("I failed to get or create the country entry. I'm aborting.")
+        return
+    
+    region_id = location_ids.region_id(state, country_id, code=state_abbr)
+    if region_id is None:
+        print("Failed to get or create region entry. Aborting.")
+        return
+    
+    return RowPipeline(region_id, city_filter, on_progress, timings)
 
-def fallback_scraper(state, city_filter=None):
+def finish_state_pipeline(state, pipeline, city_filter, report):
+    """
+    Waits for a state's pipeline to drain and records its outcome in the report.
+    Stored codes missing from the scrape are only deleted when the scrape read
+    every page of the whole state, as recorded by record_pagination; a report
+    without pagination never deletes. report["complete"] says whether the
+    region now stores exactly what geonames lists: every page read and every
+    row written, for the whole state.
+    
+    Returns:
+        list: The PostcodeRow records that passed the city filter
     """
-    A fallback scraper that uses requests and BeautifulSoup instead of Playwright.
+    complete = not city_filter and pagination_complete(report)
+    results = pipeline.finish(complete)
+    
+    insert_summaries, update_summaries = pipeline.insert_summaries, pipeline.update_summaries
+    chunk_summaries = insert_summaries + update_summaries
+    conflict_count = sum(c["conflicts"] for c in chunk_summaries)
+    error_count = sum(c["sent"] for c in chunk_summaries if c["error"])
+    report["db_inserted"] = sum(c["success"] for c in insert_summaries)
+    report["db_deleted"] = pipeline.deleted
+    report["db_recent"] = [row for c in insert_summaries for row in c["recent"]][-5:]
+    report["changes"] = {
+        "inserted": report["db_inserted"],
+        "updated": sum(c["success"] for c in update_summaries),
+        "deleted": pipeline.deleted,
+        "unchanged": pipeline.unchanged,
+        "conflicts": conflict_count,
+        "errors": error_count,
+        "deletes_skipped": pipeline.deletes_skipped,
+    }
+    report["timings"] = pipeline.timings.as_dict()
+    
+    # A foreign key error means the cached region id no longer exists
+    if any(c["error"] and c["error"].startswith("23503") for c in chunk_summaries):
+        location_ids.invalidate()
+    
+    # A complete, fully stored state answers later city lookups without a crawl
+    stored_completely = not error_count and pagination_complete(report)
+    report["complete"] = stored_completely and not city_filter
+    if stored_completely:
+        city_indexes.put(state, pipeline.rows)
+    
+    # --- This block should be OUTSIDE the loop ---
+    print(f"\nScraping completed for {state}" + (f" (City: {city_filter})" if city_filter else "") + ":")
+    print(f"Changes: {report['db_inserted']} inserted, {report['changes']['updated']} updated, "
+          f"{pipeline.deleted} deleted, {pipeline.unchanged} unchanged ({conflict_count} belonged to other regions).")
+    print(f"Errors encountered: {error_count} postcodes.")
+    print(f"Total results in list: {len(results)}")
+    print(f"Page served by the '{report.get('engine')}' engine.")
+    print(f"Stage timings (s): {report['timings']}")
+    
+    # Return the results list
+    return results
+
+def fallback_scraper(state, city_filter=None, label=None):
+    """
+    A fallback scraper that uses the pooled HTTP client and the streaming row parser instead of Playwright.
     This is used when Playwright browsers are not available.
     
     Args:
         state (str): The state to scrape postcodes for
         city_filter (str, optional): Filter results to this city only
+        label (str, optional): Names the job in debug capture files
         
     Returns:
-        list: List of dictionaries with postcode data
+        list: PostcodeRow (place_name, code) records
     """
     try:
-        import requests
-        from bs4 import BeautifulSoup
-        
-        # Explicitly tell Playwright to use system-installed browsers (redundant here, but safe)
         print(f"Using fallback scraper for {state} {city_filter if city_filter else ''}")
         
         # Get state details from map
@@ -384,49 +591,26 @@ def fallback_scraper(state, city_filter=None):
         # Create the URL
         url = f"https://www.geonames.org/postal-codes/US/{state_abbr}/{state_slug}.html"
         
-        # Send a request to the URL
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers)
+        # Send a request to the URL over the shared connection pool
+        status_code, html_content = fetch_page(url, cacheable=is_cacheable_page)
         
-        if response.status_code != 200:
-            print(f"Failed to fetch data: Status code {response.status_code}")
+        if status_code != 200:
+            print(f"Failed to fetch data: Status code {status_code}")
             return []
         
-        # Save the HTML for debugging
-        debug_dir = "debug_output"
-        os.makedirs(debug_dir, exist_ok=True)
-        with open(f"{debug_dir}/fallback_page_source.html", "w", encoding="utf-8") as f:
-            f.write(response.text)
-        
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Find the table with postal codes
-        table = soup.find('table', class_='restable')
-        if not table:
+        # Parse the postal code table straight out of the HTML
+        rows = parse_postcode_rows(html_content)
+        if debug_capture.wants(failed=rows is None):
+            debug_capture.capture(label or state, "fallback_no_table" if rows is None else "fallback",
+                                  html_content)
+        if rows is None:
             print("Could not find postal code table")
             return []
         
-        # Extract data from the table
-        results = []
-        rows = table.find_all('tr')[1:]  # Skip header row
-        
-        for row in rows:
-            cells = row.find_all('td')
-            if len(cells) >= 3:  # Ensure there are at least 3 columns
-                place_name = cells[1].text.strip() # Second column is the place name
-                postcode = cells[2].text.strip()   # Third column is the postal code
-                
-                # Apply city filter if provided
-                if city_filter and city_filter.lower() not in place_name.lower():
-                    continue
-                
-                results.append({
-                    'place_name': place_name,
-                    'code': postcode
-                })
+        # Apply city filter if provided
+        results = rows
+        if city_filter:
+            results = [row for row in rows if city_filter.lower() in row.place_name.lower()]
         
         print(f"Fallback scraper found {len(results)} results")
         return results
@@ -0,0 +1,93 @@
+import os
+import atexit
+import threading
+
+import httpx
+
+from scraper.page_cache import get_page_cache, record_cache_outcome
+
+# Connection pool settings for the plain-HTTP scrape engine
+HTTP_POOL_SIZE = int(os.environ.get("SCRAPER_HTTP_POOL_SIZE", "10"))
+HTTP_TIMEOUT = float(os.environ.get("SCRAPER_HTTP_TIMEOUT", "30"))
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """
+    Returns the process-wide httpx client used for scraping.
+    httpx.Client is thread-safe, so every job shares its keep-alive pool.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                headers=DEFAULT_HEADERS,
+                timeout=HTTP_TIMEOUT,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_SIZE,
+                    max_keepalive_connections=HTTP_POOL_SIZE,
+                ),
+            )
+        return _client
+
+
+def close_http_client():
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+def fetch_page(url, report=None, cacheable=None):
+    """
+    GETs a page through the page cache.
+
+    Fresh cache entries are served without touching the network; stale ones
+    are revalidated with a conditional GET and reused on 304.
+
+    Args:
+        url (str): The page URL
+        report (dict, optional): Receives hit/revalidated/miss counts
+        cacheable (callable, optional): Called with the body of a 200; only pages it
+            accepts are stored (e.g. to keep captcha pages out of the cache)
+
+    Returns:
+        tuple: (status_code, text)
+    """
+    cache = get_page_cache()
+    cached = cache.get(url) if cache else None
+    if cached and cached.is_fresh(cache.ttl):
+        record_cache_outcome(report, "hit")
+        return 200, cached.body
+
+    headers = cached.conditional_headers() if cached else {}
+    response = get_http_client().get(url, headers=headers)
+    return handle_page_response(url, response.status_code, response.text, response.headers,
+                                cached, report, cacheable)
+
+
+def handle_page_response(url, status_code, text, headers, cached, report=None, cacheable=None):
+    """Applies a (possibly conditional) response to the cache. Shared with the async crawler."""
+    cache = get_page_cache()
+    if status_code == 304 and cached:
+        cache.touch(url)
+        record_cache_outcome(report, "revalidated")
+        return 200, cached.body
+
+    record_cache_outcome(report, "miss")
+    if cache and status_code == 200 and (cacheable is None or cacheable(text)):
+        cache.put(url, text, headers.get("ETag"), headers.get("Last-Modified"))
+    return status_code, text
+
+
+atexit.register(close_http_client)
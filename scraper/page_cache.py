@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import Counter
+
+# On-disk cache of fetched geonames pages
+PAGE_CACHE_ENABLED = os.environ.get("PAGE_CACHE_ENABLED", "1") not in ("0", "false", "False")
+PAGE_CACHE_DIR = os.environ.get("PAGE_CACHE_DIR", "page_cache")
+PAGE_CACHE_TTL = float(os.environ.get("PAGE_CACHE_TTL", str(6 * 3600)))          # served without any request
+PAGE_CACHE_MAX_AGE = float(os.environ.get("PAGE_CACHE_MAX_AGE", str(7 * 24 * 3600)))  # dropped entirely
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("PAGE_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# Eviction frees space down to this fraction of max_bytes, so it doesn't run again on the next put
+EVICT_TO_FRACTION = 0.9
+# Unreferenced bodies younger than this may belong to a put still in progress in another process
+ORPHAN_GRACE_SECONDS = 60
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedPage:
+    """A cached response: body plus the validators needed to revalidate it."""
+
+    def __init__(self, url, body, etag=None, last_modified=None, fetched_at=0.0):
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def is_fresh(self, ttl=PAGE_CACHE_TTL):
+        return self.age() < ttl
+
+    def conditional_headers(self):
+        """Headers for a conditional GET that lets the server answer 304."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """
+    Content-addressed page cache.
+
+    Bodies live in bodies/<sha256 of body>.html, so identical pages are stored
+    once; index/<sha256 of url>.json maps a URL to its body and validators.
+    Entries are fresh for `ttl` seconds, revalidated with a conditional GET
+    after that, and evicted once older than `max_age` or, oldest first, when
+    the bodies exceed `max_bytes`.
+
+    The size of the bodies is kept as a running total, so a put only scans
+    the directory when that total passes max_bytes (or once per `ttl`, to
+    drop expired entries). The scan re-measures the total, which also picks
+    up what other processes sharing the directory have written. Files can
+    disappear under another process's eviction at any point, so a missing
+    file is never an error.
+    """
+
+    def __init__(self, directory=PAGE_CACHE_DIR, ttl=PAGE_CACHE_TTL, max_age=PAGE_CACHE_MAX_AGE,
+                 max_bytes=PAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.index_dir = os.path.join(directory, "index")
+        self.bodies_dir = os.path.join(directory, "bodies")
+        self._lock = threading.Lock()
+        self._bytes = None  # measured by the first sweep
+        self._swept_at = 0.0
+        os.makedirs(self.index_dir, exist_ok=True)
+        os.makedirs(self.bodies_dir, exist_ok=True)
+
+    def _index_path(self, url):
+        return os.path.join(self.index_dir, f"{_sha256(url)}.json")
+
+    def _body_path(self, body_hash):
+        return os.path.join(self.bodies_dir, f"{body_hash}.html")
+
+    @staticmethod
+    def _write_atomic(path, text):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def get(self, url):
+        """Returns the CachedPage for a URL, or None on a miss."""
+        try:
+            with open(self._index_path(url), encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(self._body_path(meta["body_hash"]), encoding="utf-8") as f:
+                body = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        if time.time() - meta.get("fetched_at", 0) >= self.max_age:
+            return None
+        return CachedPage(url, body, meta.get("etag"), meta.get("last_modified"), meta.get("fetched_at", 0))
+
+    def put(self, url, body, etag=None, last_modified=None):
+        """Stores a freshly fetched page."""
+        body_hash = _sha256(body)
+        meta = {
+            "url": url,
+            "body_hash": body_hash,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+            "size": len(body.encode("utf-8")),
+        }
+        with self._lock:
+            body_path = self._body_path(body_hash)
+            if not os.path.exists(body_path):
+                self._write_atomic(body_path, body)
+                if self._bytes is not None:
+                    self._bytes += meta["size"]
+            self._write_atomic(self._index_path(url), json.dumps(meta))
+            if self._bytes is None or self._bytes > self.max_bytes or time.time() - self._swept_at >= self.ttl:
+                self._evict()
+
+    def touch(self, url):
+        """Marks a page as fetched now, after the server confirmed it with a 304."""
+        with self._lock:
+            path = self._index_path(url)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                return
+            meta["fetched_at"] = time.time()
+            self._write_atomic(path, json.dumps(meta))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """
+        Drops expired entries, then the oldest ones until the bodies fit
+        EVICT_TO_FRACTION of max_bytes, and re-measures the running total.
+        """
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.index_dir):
+            path = os.path.join(self.index_dir, name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - meta.get("fetched_at", 0) >= self.max_age:
+                self._remove(path)
+            else:
+                entries.append((meta.get("fetched_at", 0), path, meta))
+
+        # Bodies are shared between URLs, so each is counted once and freed with its last entry
+        body_sizes = {meta["body_hash"]: meta.get("size", 0) for _, _, meta in entries}
+        references = Counter(meta["body_hash"] for _, _, meta in entries)
+        total = sum(body_sizes.values())
+        if total > self.max_bytes:
+            target = self.max_bytes * EVICT_TO_FRACTION
+            entries.sort(key=lambda entry: entry[0])
+            for _, path, meta in entries:
+                if total <= target:
+                    break
+                self._remove(path)
+                references[meta["body_hash"]] -= 1
+                if not references[meta["body_hash"]]:
+                    del references[meta["body_hash"]]
+                    total -= body_sizes[meta["body_hash"]]
+                    self._remove(self._body_path(meta["body_hash"]))
+
+        # Bodies left behind by expired entries or by other processes
+        for name in os.listdir(self.bodies_dir):
+            if not name.endswith(".html") or name[:-len(".html")] in references:
+                continue
+            path = os.path.join(self.bodies_dir, name)
+            try:
+                if now - os.path.getmtime(path) < ORPHAN_GRACE_SECONDS:
+                    continue
+            except FileNotFoundError:
+                continue
+            self._remove(path)
+        self._bytes = total
+        self._swept_at = now
+
+    def stats(self):
+        entries = len(os.listdir(self.index_dir))
+        size = 0
+        for name in os.listdir(self.bodies_dir):
+            try:
+                size += os.path.getsize(os.path.join(self.bodies_dir, name))
+            except FileNotFoundError:
+                continue
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "ttl": self.ttl}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """Returns the process-wide page cache, or None when PAGE_CACHE_ENABLED is off."""
+    global _cache
+    if not PAGE_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = PageCache()
+        return _cache
+
+
+def record_cache_outcome(report, outcome):
+    """Counts "hit", "revalidated" and "miss" outcomes in a job report."""
+    if report is not None:
+        counts = report.setdefault("page_cache", {})
+        counts[outcome] = counts.get(outcome, 0) + 1
@@ -0,0 +1,172 @@
+import os
+import time
+import queue
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from supabase_utils.db_client import upsert_postcodes_bulk, delete_postcodes, get_region_postcodes
+
+# Rows per database write request
+UPSERT_CHUNK_SIZE = int(os.environ.get("POSTCODE_UPSERT_CHUNK_SIZE", "500"))
+# Concurrent write requests per job
+DB_WRITERS = int(os.environ.get("SCRAPER_DB_WRITERS", "2"))
+# Pages of rows buffered between the fetchers and the writer; fetchers wait while it is full
+PIPELINE_QUEUE_PAGES = int(os.environ.get("SCRAPER_PIPELINE_QUEUE", "8"))
+
+_DONE = object()
+
+
+class StageTimings:
+    """Seconds spent per stage, summed over every thread that ran it."""
+
+    def __init__(self):
+        self._seconds = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def as_dict(self):
+        with self._lock:
+            return {stage: round(seconds, 3) for stage, seconds in self._seconds.items()}
+
+
+class RowPipeline:
+    """
+    Streams one region's scraped rows into the database while pages are still
+    being fetched.
+
+    Fetchers put() each page's PostcodeRow records on a bounded queue and
+    block while it is full. A consumer thread loads the region's stored rows
+    once, drops codes it has already seen (the first place name wins, as in
+    merge_rows), applies the city filter and diffs each row against the
+    stored one. New and renamed rows are batched and handed to `writers`
+    threads, so database writes overlap fetching and parsing. finish() waits
+    for all of it and, only for a complete scrape, deletes the stored codes
+    the pages no longer list.
+    """
+
+    def __init__(self, region_id, city_filter=None, on_progress=None, timings=None, writers=DB_WRITERS,
+                 queue_pages=PIPELINE_QUEUE_PAGES, batch_size=UPSERT_CHUNK_SIZE):
+        self.region_id = region_id
+        self.city_filter = city_filter.lower() if city_filter else None
+        self.on_progress = on_progress
+        self.timings = timings or StageTimings()
+        self.batch_size = batch_size
+        self.rows = []      # every unique row, in arrival order
+        self.results = []   # the rows that pass the city filter
+        self.unchanged = 0
+        self.deleted = 0
+        self.deletes_skipped = 0
+        self.insert_summaries = []
+        self.update_summaries = []
+        self._queue = queue.Queue(maxsize=queue_pages)
+        self._writers = ThreadPoolExecutor(max_workers=max(1, writers), thread_name_prefix="postcode-writer")
+        self._writes = []
+        self._existing = {}
+        self._seen = set()
+        self._inserts = []
+        self._updates = []
+        self._rows_submitted = 0
+        self._rows_stored = 0
+        self._error = None
+        self._lock = threading.Lock()
+        self._consumer = threading.Thread(target=self._consume, name="postcode-diff", daemon=True)
+        self._consumer.start()
+
+    def put(self, rows):
+        """Hands one page of rows on; blocks while the writer is PIPELINE_QUEUE_PAGES pages behind."""
+        with self.timings.time("queue_wait"):
+            self._queue.put(rows)
+
+    def _consume(self):
+        done = False
+        try:
+            with self.timings.time("load_existing"):
+                self._existing = {row["code"]: row for row in get_region_postcodes(self.region_id)}
+            while True:
+                rows = self._queue.get()
+                if rows is _DONE:
+                    done = True
+                    break
+                with self.timings.time("diff"):
+                    self._diff(rows)
+            self._flush(final=True)
+        except Exception as e:
+            print(f"Postcode pipeline failed: {e}")
+            self._error = e
+            # Producers must never block on a consumer that has stopped
+            while not done:
+                done = self._queue.get() is _DONE
+
+    def _diff(self, rows):
+        for row in rows:
+            if row.code in self._seen:
+                continue
+            self._seen.add(row.code)
+            self.rows.append(row)
+            if self.city_filter and self.city_filter not in row.place_name.lower():
+                continue
+            self.results.append(row)
+            stored = self._existing.get(row.code)
+            if stored is None:
+                self._inserts.append(row)
+            elif stored["place_name"] != row.place_name:
+                self._updates.append(row)
+            else:
+                self.unchanged += 1
+        self._flush()
+
+    def _flush(self, final=False):
+        # Full batches go out as soon as they fill; the remainder waits for more rows or the end
+        for pending, ignore_duplicates in ((self._inserts, True), (self._updates, False)):
+            cut = len(pending) if final else len(pending) - len(pending) % self.batch_size
+            for start in range(0, cut, self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                self._rows_submitted += len(batch)
+                self._writes.append(self._writers.submit(self._write, batch, ignore_duplicates))
+            del pending[:cut]
+
+    def _write(self, batch, ignore_duplicates):
+        with self.timings.time("write"):
+            summaries = upsert_postcodes_bulk(batch, self.region_id, chunk_size=len(batch),
+                                              ignore_duplicates=ignore_duplicates)
+        with self._lock:
+            (self.insert_summaries if ignore_duplicates else self.update_summaries).extend(summaries)
+            self._rows_stored += len(batch)
+            rows_stored = self._rows_stored
+        if self.on_progress:
+            self.on_progress({"stage": "storing", "rows_found": self._rows_submitted, "rows_stored": rows_stored})
+
+    def finish(self, complete=True):
+        """
+        Waits for the queued pages and their writes. With complete (every page
+        of the region was read), stored codes missing from the scrape are
+        deleted; otherwise they are only counted in deletes_skipped.
+        Returns the rows that passed the city filter.
+        """
+        self._queue.put(_DONE)
+        self._consumer.join()
+        wait(self._writes)
+        self._writers.shutdown()
+        errors = [self._error] + [future.exception() for future in self._writes]
+        for error in errors:
+            if error is not None:
+                raise error
+        missing = [stored["id"] for code, stored in self._existing.items() if code not in self._seen]
+        if complete and missing:
+            with self.timings.time("delete"):
+                self.deleted = delete_postcodes(missing, chunk_size=self.batch_size)
+        elif missing:
+            self.deletes_skipped = len(missing)
+        return self.results
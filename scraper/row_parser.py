@@ -0,0 +1,127 @@
+from html.parser import HTMLParser
+from typing import NamedTuple
+
+# Characters of HTML handed to the parser per feed() call
+FEED_CHUNK_SIZE = 16 * 1024
+
+
+class PostcodeRow(NamedTuple):
+    """
+    One scraped postcode. Rows stay in this form from the parser through the
+    database writer, job results and exports (JSON stores them as
+    [place_name, code]); only API responses spell out the field names.
+    """
+
+    place_name: str
+    code: str
+
+
+class RestableRowParser(HTMLParser):
+    """
+    Streaming parser for geonames' `table.restable`.
+
+    Collects PostcodeRow (place_name, code) pairs as rows close, without building a
+    document tree. Cells outside the table are never buffered, and parsing
+    can stop as soon as the table ends.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.found_table = False
+        self.finished = False
+        self.rows = []
+        self._table_depth = 0
+        self._cells = None
+        self._cell_text = None
+
+    def _close_cell(self):
+        if self._cell_text is not None:
+            self._cells.append("".join(self._cell_text).strip())
+            self._cell_text = None
+
+    def _close_row(self):
+        if self._cells is None:
+            return
+        self._close_cell()
+        # Data rows are: index, place, code, ...; the interleaved coordinate rows have 2 cells
+        if len(self._cells) >= 3 and self._cells[1] and self._cells[2]:
+            self.rows.append(PostcodeRow(self._cells[1], self._cells[2]))
+        self._cells = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.finished:
+            return
+        if tag == "table":
+            if self._table_depth:
+                self._table_depth += 1
+            elif "restable" in (dict(attrs).get("class") or "").split():
+                self.found_table = True
+                self._table_depth = 1
+            return
+        if self._table_depth != 1:
+            return
+        if tag == "tr":
+            self._close_row()
+            self._cells = []
+        elif tag == "td" and self._cells is not None:
+            self._close_cell()
+            self._cell_text = []
+        elif tag == "th":
+            # Header cells are not data; stop collecting into the previous cell
+            self._close_cell()
+
+    def handle_endtag(self, tag):
+        if not self._table_depth:
+            return
+        if tag == "table":
+            self._table_depth -= 1
+            if not self._table_depth:
+                self._close_row()
+                self.finished = True
+        elif self._table_depth == 1:
+            if tag == "td":
+                self._close_cell()
+            elif tag == "tr":
+                self._close_row()
+
+    def handle_data(self, data):
+        if self._cell_text is not None:
+            self._cell_text.append(data)
+
+
+def iter_restable_rows(html_content, parser=None):
+    """
+    Yields (place_name, code) pairs from the page's `table.restable` as they are parsed.
+
+    Args:
+        html_content (str): The page HTML
+        parser (RestableRowParser, optional): Pass one in to inspect found_table afterwards
+    """
+    if parser is None:
+        parser = RestableRowParser()
+    # Skip straight to the table: everything before its opening tag is irrelevant
+    marker = html_content.find("restable")
+    if marker == -1:
+        return
+    offset = max(html_content.rfind("<table", 0, marker), 0)
+    for start in range(offset, len(html_content), FEED_CHUNK_SIZE):
+        parser.feed(html_content[start:start + FEED_CHUNK_SIZE])
+        if parser.rows:
+            yield from parser.rows
+            parser.rows = []
+        if parser.finished:
+            break
+    else:
+        parser.close()
+        yield from parser.rows
+        parser.rows = []
+
+
+def parse_postcode_rows(html_content):
+    """
+    Returns the (place_name, code) pairs of the page's postcode table,
+    or None if the page has no `table.restable`.
+    """
+    parser = RestableRowParser()
+    rows = list(iter_restable_rows(html_content, parser))
+    return rows if parser.found_table else None
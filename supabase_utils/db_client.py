@@ -1,7 +1,8 @@
 import os
 import sys # Import sys module
 import traceback # Keep for error handling if needed
-from typing import Dict, Any, Optional
+import threading
+from typing import Callable, Dict, Any, Iterator, List, Optional
 # import pandas as pd # Removed as it seems unused
 
 # Add parent directory to path to find config
@@ -9,15 +10,19 @@ from typing import Dict, Any, Optional
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Third-party imports
+# The supabase package itself is imported when the client is first needed (see
+# get_client): it pulls in auth, storage and realtime clients on import.
 try:
-    from supabase import create_client, Client
     # Use the exceptions path consistently
     from postgrest.exceptions import APIError
+    from postgrest.types import CountMethod
 except ImportError as e:
     print(f"Error importing Supabase modules: {e}")
     print("Make sure 'supabase-py' is installed (`pip install supabase`).")
     sys.exit(1)
 
+from supabase_utils.http_pool import PooledPostgrestClient
+
 # Local imports (config)
 try:
     from config import SUPABASE_URL, SUPABASE_KEY
@@ -32,10 +37,11 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     print("Error: Supabase URL and Key must be set in config.py or environment variables.")
     sys.exit(1)
 
-def initialize_supabase_client():
+def check_supabase_connection():
     """
-    Initialize Supabase client with version compatibility handling.
-    Returns the initialized client or exits on failure.
+    Diagnoses connection problems: prints the proxy settings and tries a plain
+    GET against the project's auth endpoint. Not run on import (it can block
+    for the full timeout without a network); run this module to call it.
     """
     # --- Debug: Print relevant environment variables ---
     print("--- Checking Environment Variables ---")
@@ -55,23 +61,61 @@ def initialize_supabase_client():
         with httpx.Client() as http_client:
             response = http_client.get(test_url, timeout=15.0) # Increased timeout slightly
             print(f"httpx GET request successful. Status code: {response.status_code}")
+            return True
     except Exception as http_err:
         print(f"httpx direct connection failed: {http_err}")
         print("This might indicate an underlying network/proxy/SSL issue.")
-    print("------------------------------")
+        return False
+    finally:
+        print("------------------------------")
 
-    # --- Attempt Initialization (Simplified) ---
+def initialize_supabase_client():
+    """
+    Creates a Supabase client. No request is made until the client is used.
+    Raises if the supabase package is missing or the client can't be created.
+    """
+    from supabase import create_client
+    print("Attempting initialization with create_client...")
     try:
-        print("Attempting initialization with create_client...")
         client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        print("Supabase client initialized successfully using create_client.")
-        return client
+        # Database calls go through our pooled, instrumented session (see http_pool.py);
+        # the stock one keeps its headers, including the API key
+        default_postgrest = client.postgrest
+        client.postgrest = PooledPostgrestClient(client.rest_url, headers=dict(default_postgrest.session.headers),
+                                                 schema=client.schema)
+        default_postgrest.aclose()
     except Exception as e:
         print(f"Error initializing Supabase client: {e}")
-        sys.exit(1)
+        raise
+    print("Supabase client initialized successfully using create_client.")
+    return client
+
+_client = None
+_client_lock = threading.Lock()
 
-# Initialize Supabase Client using the compatibility function
-supabase = initialize_supabase_client()
+def get_pool_stats() -> Dict[str, Any]:
+    """Connection pool settings and per-call latency of database requests made so far."""
+    if _client is None:
+        return {"connected": False}
+    return {"connected": True, **_client.postgrest.stats()}
+
+def get_client():
+    """
+    Returns the process-wide Supabase client, creating it on first use.
+    All callers share it, and with it the PostgREST HTTP connection pool.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = initialize_supabase_client()
+    return _client
+
+def __getattr__(name):
+    # Keeps `db_client.supabase` working without creating the client at import time
+    if name == "supabase":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def insert_and_get_id(table_name: str, data: Dict[str, Any], unique_column: str) -> Optional[int]:
     """
@@ -80,7 +124,7 @@ def insert_and_get_id(table_name: str, data: Dict[str, Any], unique_column: str)
     """
     print(f"Attempting to insert into '{table_name}': {data}")
     try:
-        response = supabase.table(table_name).insert(data).execute()
+        response = get_client().table(table_name).insert(data).execute()
         if response.data:
             new_id = response.data[0].get('id')
             print(f"Successfully inserted into '{table_name}', new ID: {new_id}")
@@ -104,7 +148,7 @@ def get_id_by_column(table_name: str, column_name: str, column_value: Any, **kwa
     print(f"Checking for ID in '{table_name}' where {column_name}='{column_value}'" + 
           (f" and {kwargs}" if kwargs else ""))
     try:
-        query = supabase.table(table_name).select("id").eq(column_name, column_value)
+        query = get_client().table(table_name).select("id").eq(column_name, column_value)
         for key, value in kwargs.items():
             query = query.eq(key, value)
         
@@ -135,9 +179,9 @@ def insert_postcode_data(data: Dict[str, Any]) -> bool:
     try:
         # Note: If the 'code' column has a UNIQUE constraint and you want to
         # UPDATE existing entries instead of skipping, use the .upsert() method:
-        # supabase.table("postcodes").upsert(data, on_conflict='code').execute()
+        # get_client().table("postcodes").upsert(data, on_conflict='code').execute()
 
-        response = supabase.table("postcodes").insert(data).execute()
+        response = get_client().table("postcodes").insert(data).execute()
         
         if hasattr(response, 'data') and response.data:
              print(f"Successfully inserted postcode: {data.get('code')}")
@@ -166,36 +210,197 @@ def insert_postcode_data(data: Dict[str, Any]) -> bool:
         print(traceback.format_exc())
         return False
 
+def upsert_postcodes_bulk(rows: List[Any], region_id: Optional[int] = None, chunk_size: int = 500,
+                          on_conflict: str = "code", ignore_duplicates: bool = True,
+                          on_chunk: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    """
+    Upserts postcode rows into the 'postcodes' table, one request per chunk.
+
+    Rows are column dicts or, with region_id, (place_name, code) records of
+    that region; records are only turned into request dicts a chunk at a time.
+
+    With ignore_duplicates (the default) existing rows are left untouched, which
+    matches insert_postcode_data's skip-on-23505 behaviour. PostgREST then only
+    returns the rows it actually inserted, so the remainder of each chunk is
+    reported as conflicts. With ignore_duplicates=False conflicting rows are
+    merged (updated) and counted as successes.
+
+    Returns one summary per chunk:
+        {"chunk": i, "sent": n, "success": n, "conflicts": n, "error": str | None,
+         "recent": [the last few rows written, as returned by PostgREST]}
+    on_chunk, if given, is called with each summary as soon as its chunk is done.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    # De-duplicate on the conflict key first: Postgres refuses to touch the same
+    # row twice within one INSERT ... ON CONFLICT DO UPDATE statement.
+    if region_id is not None:
+        unique_rows = list({row[1]: row for row in rows}.values())  # keyed on code
+    else:
+        unique_rows = list({row.get(on_conflict): row for row in rows}.values())
+
+    summaries = []
+    for index, start in enumerate(range(0, len(unique_rows), chunk_size)):
+        chunk = unique_rows[start:start + chunk_size]
+        if region_id is not None:
+            chunk = [{"code": code, "place_name": place_name, "region_id": region_id} for place_name, code in chunk]
+        summary = {"chunk": index, "sent": len(chunk), "success": 0, "conflicts": 0, "error": None, "recent": []}
+        try:
+            response = get_client().table("postcodes").upsert(
+                chunk, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates
+            ).execute()
+            written = len(response.data) if getattr(response, 'data', None) else 0
+            summary["recent"] = response.data[-5:] if written else []
+            if ignore_duplicates:
+                summary["success"] = written
+                summary["conflicts"] = len(chunk) - written
+            else:
+                summary["success"] = len(chunk)
+        except APIError as e:
+            print(f"Database API Error during bulk upsert of chunk {index}: {e}")
+            summary["error"] = f"{e.code}: {e.message}"
+        except Exception as e:
+            print(f"An unexpected error occurred during bulk upsert of chunk {index}: {e}")
+            summary["error"] = str(e)
+        print(f"Bulk upsert chunk {index}: sent={summary['sent']} success={summary['success']} "
+              f"conflicts={summary['conflicts']}" + (f" error={summary['error']}" if summary["error"] else ""))
+        summaries.append(summary)
+        if on_chunk:
+            on_chunk(summary)
+    return summaries
+
+def delete_postcodes(ids: List[int], chunk_size: int = 500) -> int:
+    """Deletes postcodes by id, one request per chunk. Returns how many rows were deleted."""
+    deleted = 0
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        try:
+            response = get_client().table("postcodes").delete().in_("id", chunk).execute()
+            deleted += len(response.data or [])
+        except APIError as e:
+            print(f"Database API Error deleting postcodes: {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred while deleting postcodes: {e}")
+    return deleted
+
+def get_region_postcodes(region_id: int, page_size: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Returns the id, code and place_name of every postcode in a region.
+    Errors propagate: an empty list would read as "nothing stored" to callers that diff against it.
+    """
+    return list(iter_postcodes(page_size=page_size, region_id=region_id, columns="id,code,place_name"))
+
+def iter_postcodes(page_size: int = 1000, region_id: Optional[int] = None,
+                   columns: str = "*") -> Iterator[Dict[str, Any]]:
+    """
+    Yields postcodes in id order, one page at a time.
+
+    Uses keyset pagination (id > last seen id) rather than OFFSET, so every
+    page costs the same index range scan however deep into the table it is.
+    The selected columns must include 'id'. Errors propagate to the caller.
+    """
+    last_id = None
+    while True:
+        query = get_client().table("postcodes").select(columns)
+        if region_id is not None:
+            query = query.eq("region_id", region_id)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        response = query.order("id").limit(page_size).execute()
+        page = response.data or []
+        yield from page
+        if len(page) < page_size:
+            return
+        last_id = page[-1]["id"]
+
+def count_postcodes(region_id: Optional[int] = None) -> int:
+    """
+    Counts postcodes (optionally in one region) using PostgREST's exact count.
+    Only the Content-Range header and a single id come back over the wire.
+    """
+    try:
+        query = get_client().table("postcodes").select("id", count=CountMethod.exact)
+        if region_id is not None:
+            query = query.eq("region_id", region_id)
+        response = query.limit(1).execute()
+        return response.count or 0
+    except Exception as e:
+        print(f"Error counting postcodes: {e}")
+        return 0
+
+def get_postcode_counts_by_region() -> Dict[str, int]:
+    """
+    Returns {region name: postcode count} in a single round trip, read from the
+    postcode_counts_by_region view (supabase_utils/sql/postcode_counts_by_region.sql).
+    Falls back to one exact count per region if the view hasn't been created yet.
+    """
+    try:
+        response = get_client().table("postcode_counts_by_region").select("region_name,postcode_count").execute()
+        return {row["region_name"]: row["postcode_count"] for row in response.data or []}
+    except APIError as e:
+        print(f"postcode_counts_by_region view unavailable ({e.code}), counting per region instead.")
+    except Exception as e:
+        print(f"Error getting grouped region counts: {e}")
+        return {}
+
+    try:
+        response = get_client().table("regions").select("id,name").execute()
+        return {region["name"]: count_postcodes(region["id"]) for region in response.data or []}
+    except Exception as e:
+        print(f"Error getting region counts: {e}")
+        return {}
+
+def get_recent_postcodes(limit: int = 5) -> List[Dict[str, Any]]:
+    """Returns the most recently inserted postcodes, oldest first."""
+    try:
+        response = get_client().table("postcodes").select("*").order("id", desc=True).limit(limit).execute()
+        return list(reversed(response.data or []))
+    except Exception as e:
+        print(f"Error retrieving recent postcodes: {e}")
+        return []
+
+def get_regions(country_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Returns the id and name of every region (optionally in one country), ordered by name."""
+    try:
+        query = get_client().table("regions").select("id,name")
+        if country_id is not None:
+            query = query.eq("country_id", country_id)
+        response = query.order("name").execute()
+        return response.data or []
+    except Exception as e:
+        print(f"Error retrieving regions: {e}")
+        return []
+
 # Legacy functions maintained for backwards compatibility
 def insert_country(data):
-    response = supabase.table("countries").insert(data).execute()
+    response = get_client().table("countries").insert(data).execute()
     return response
 
 def insert_region(data):
-    response = supabase.table("regions").insert(data).execute()
+    response = get_client().table("regions").insert(data).execute()
     return response
 
 def insert_postcode(data):
-    response = supabase.table("postcodes").insert(data).execute()
+    response = get_client().table("postcodes").insert(data).execute()
     return response
 
 def get_region_id(region_name, country_id):
-    response = supabase.table("regions").select("id").eq("name", region_name).eq("country_id", country_id).execute()
+    response = get_client().table("regions").select("id").eq("name", region_name).eq("country_id", country_id).execute()
     return response.data[0]['id'] if response.data else None
 
 def get_country_id(country_name):
-    response = supabase.table("countries").select("id").eq("name", country_name).execute()
+    response = get_client().table("countries").select("id").eq("name", country_name).execute()
     return response.data[0]['id'] if response.data else None
 
 def get_all_postcodes():
     """
-    Retrieves all postcodes from the database
+    Retrieves all postcodes from the database.
+    Prefer count_postcodes / get_recent_postcodes / iter_postcodes where possible:
+    this materialises the whole table.
     """
     try:
-        response = supabase.table("postcodes").select("*").execute()
-        if hasattr(response, 'data'):
-            return response.data
-        return []
+        return list(iter_postcodes())
     except Exception as e:
         print(f"Error retrieving postcodes: {e}")
         return []
@@ -246,5 +451,6 @@ def scrape_postcodes():
 
 # --- Script Execution ---
 if __name__ == "__main__":
+    check_supabase_connection()
     scrape_postcodes()
     
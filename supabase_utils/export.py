@@ -0,0 +1,141 @@
+import io
+import os
+import csv
+import json
+import itertools
+import functools
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from supabase_utils.db_client import iter_postcodes
+
+# Rows encoded per chunk (CSV/NDJSON) or per row group (Parquet); also the database page size
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", "1000"))
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Export headers; rows are tuples with their values in this order
+JOB_COLUMNS = ["Post-Code", "City/Town"]
+REGION_COLUMNS = ["Post-Code", "City/Town", "Region"]
+
+
+@functools.lru_cache(maxsize=None)
+def _parquet_modules():
+    # Parquet export is optional: it needs pyarrow (pip install pyarrow), imported on first use
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow, pyarrow.parquet
+
+
+def parquet_available() -> bool:
+    return _parquet_modules() is not None
+
+
+def _chunks(rows: Iterable[Sequence[Any]], size: int) -> Iterator[List[Sequence[Any]]]:
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_job_rows(results: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+    """Orders a job's (place_name, code) results as JOB_COLUMNS."""
+    for place_name, code in results:
+        yield code, place_name
+
+
+def iter_region_rows(regions: List[Dict[str, Any]], page_size: int = EXPORT_CHUNK_ROWS) -> Iterator[Tuple[str, str, str]]:
+    """Yields REGION_COLUMNS rows for each region ({"id", "name"}) straight from the database, one page at a time."""
+    for region in regions:
+        for row in iter_postcodes(page_size=page_size, region_id=region["id"], columns="id,code,place_name"):
+            yield row["code"], row["place_name"], region["name"]
+
+
+def iter_csv(rows: Iterable[Sequence[Any]], columns: List[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for chunk in _chunks(rows, EXPORT_CHUNK_ROWS):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_ndjson(rows: Iterable[Sequence[Any]], columns: List[str]) -> Iterator[bytes]:
+    for chunk in _chunks(rows, EXPORT_CHUNK_ROWS):
+        yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in chunk).encode("utf-8")
+
+
+class _DrainableSink:
+    """Write-only file object handed to ParquetWriter; each drain() returns the bytes written since the last."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def iter_parquet(rows: Iterable[Sequence[Any]], columns: List[str]) -> Iterator[bytes]:
+    """Writes one row group per chunk and hands each on as soon as it is encoded."""
+    if not parquet_available():
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    pa, pq = _parquet_modules()
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in _chunks(rows, EXPORT_CHUNK_ROWS):
+            arrays = [pa.array(values, pa.string()) for values in zip(*chunk)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_export(rows: Iterable[Sequence[Any]], columns: List[str], export_format: str) -> Iterator[bytes]:
+    """
+    Encodes rows (tuples in column order) in the given format (see EXPORT_FORMATS) as a stream of byte chunks.
+    Only one chunk of rows is held at a time, so memory doesn't grow with the export.
+    """
+    if export_format == "csv":
+        return iter_csv(rows, columns)
+    if export_format == "ndjson":
+        return iter_ndjson(rows, columns)
+    if export_format == "parquet":
+        return iter_parquet(rows, columns)
+    raise ValueError(f"Unknown export format: {export_format}")
@@ -0,0 +1,121 @@
+import os
+import time
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+from postgrest import SyncPostgrestClient
+from postgrest.utils import SyncClient
+
+# Connection pool settings for database (PostgREST) requests
+SUPABASE_POOL_SIZE = int(os.environ.get("SUPABASE_POOL_SIZE", "10"))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.environ.get("SUPABASE_KEEPALIVE_EXPIRY", "60"))
+SUPABASE_TIMEOUT = float(os.environ.get("SUPABASE_TIMEOUT", "30"))
+SUPABASE_CONNECT_TIMEOUT = float(os.environ.get("SUPABASE_CONNECT_TIMEOUT", "5"))
+# Retries for failed connection attempts only; a request that reached the server is never resent
+SUPABASE_CONNECT_RETRIES = int(os.environ.get("SUPABASE_CONNECT_RETRIES", "1"))
+# HTTP/2 multiplexes concurrent requests over one connection; needs h2 (pip install "httpx[http2]")
+SUPABASE_HTTP2 = os.environ.get("SUPABASE_HTTP2", "0") not in ("0", "false", "False")
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class MetricsTransport(httpx.BaseTransport):
+    """
+    Wraps a transport and records request count, errors and latency per
+    (method, table). The response body is read inside the timing, so latency
+    covers the whole request, not just the time to the headers.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self._transport = transport
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = f"{request.method} {request.url.path.rstrip('/').rsplit('/', 1)[-1]}"
+        with self._lock:
+            self._in_flight += 1
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = self._transport.handle_request(request)
+            response.read()
+            failed = response.status_code >= 400
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._in_flight -= 1
+                timing = self._timings.setdefault(key, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0})
+                timing["count"] += 1
+                timing["errors"] += int(failed)
+                timing["total"] += elapsed
+                timing["max"] = max(timing["max"], elapsed)
+
+    def close(self) -> None:
+        self._transport.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "requests": {
+                    key: {
+                        "count": timing["count"],
+                        "errors": timing["errors"],
+                        "avg_ms": round(timing["total"] / timing["count"] * 1000, 1),
+                        "max_ms": round(timing["max"] * 1000, 1),
+                    }
+                    for key, timing in sorted(self._timings.items())
+                },
+            }
+
+
+class PooledPostgrestClient(SyncPostgrestClient):
+    """
+    SyncPostgrestClient whose session uses the configured connection pool,
+    timeouts and (optionally) HTTP/2, with per-call metrics.
+
+    The session is an httpx client, which is safe to share between threads:
+    request handlers and scrape workers draw keep-alive connections from one
+    pool of SUPABASE_POOL_SIZE instead of opening (and TLS-handshaking) their own.
+    """
+
+    metrics: Optional[MetricsTransport] = None
+
+    def create_session(self, base_url, headers, timeout) -> SyncClient:
+        http2 = SUPABASE_HTTP2
+        if http2 and not http2_available():
+            print("SUPABASE_HTTP2 is set but the h2 package isn't installed; using HTTP/1.1.")
+            http2 = False
+        transport = httpx.HTTPTransport(
+            http2=http2,
+            retries=SUPABASE_CONNECT_RETRIES,
+            limits=httpx.Limits(
+                max_connections=SUPABASE_POOL_SIZE,
+                max_keepalive_connections=SUPABASE_POOL_SIZE,
+                keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+            ),
+        )
+        self.metrics = MetricsTransport(transport)
+        return SyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=httpx.Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT),
+            transport=self.metrics,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pool_size": SUPABASE_POOL_SIZE,
+            "http2": SUPABASE_HTTP2 and http2_available(),
+            **(self.metrics.stats() if self.metrics else {}),
+        }
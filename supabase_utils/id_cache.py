@@ -0,0 +1,118 @@
+import time
+import threading
+from typing import Any, Dict, Optional
+
+from supabase_utils.db_client import get_client, get_id_by_column, insert_and_get_id
+
+# Seconds before a failed warm-up is retried; lookups fall back to the database meanwhile
+WARM_RETRY_INTERVAL = 60
+
+
+class LocationIdCache:
+    """
+    Memoised country and region ids.
+
+    Ids never change once a row exists, so after one warm-up query (countries
+    with their regions embedded) lookups are answered from memory. A miss
+    falls back to the usual lookup, optionally creating the row, and caches
+    the result; misses are never cached, since another process may create
+    the row later. invalidate() drops everything, e.g. after a foreign key
+    error shows a cached id has gone stale.
+    """
+
+    def __init__(self):
+        self._countries: Dict[str, int] = {}
+        self._regions: Dict[str, Dict[str, Any]] = {}
+        self._warmed = False
+        self._next_warm_attempt = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def warm(self) -> bool:
+        """Loads every country and region in a single request."""
+        try:
+            response = get_client().table("countries").select("id,name,regions(id,name)").execute()
+        except Exception as e:
+            print(f"Error warming the country/region id cache: {e}")
+            self._next_warm_attempt = time.monotonic() + WARM_RETRY_INTERVAL
+            return False
+        countries, regions = {}, {}
+        for country in response.data or []:
+            countries[country["name"]] = country["id"]
+            for region in country.get("regions") or []:
+                regions[region["name"]] = {"id": region["id"], "country_id": country["id"]}
+        with self._lock:
+            self._countries.update(countries)
+            self._regions.update(regions)
+            self._warmed = True
+        print(f"Id cache warmed with {len(countries)} countries and {len(regions)} regions.")
+        return True
+
+    def _ensure_warm(self):
+        if not self._warmed and time.monotonic() >= self._next_warm_attempt:
+            self.warm()
+
+    def country_id(self, name: str, code: Optional[str] = None, create: bool = True) -> Optional[int]:
+        """Returns the country's id, creating the country when create is set and it doesn't exist."""
+        self._ensure_warm()
+        with self._lock:
+            if name in self._countries:
+                self.hits += 1
+                return self._countries[name]
+            self.misses += 1
+
+        country_id = get_id_by_column("countries", "name", name)
+        if country_id is None and create:
+            print(f"Creating {name} country entry...")
+            country_id = insert_and_get_id("countries", {"name": name, "code": code}, "name")
+        if country_id is not None:
+            with self._lock:
+                self._countries[name] = country_id
+        return country_id
+
+    def region_id(self, name: str, country_id: Optional[int] = None, code: Optional[str] = None,
+                  create: bool = True) -> Optional[int]:
+        """
+        Returns the region's id. With country_id, only a region of that country
+        matches, and create (the default) inserts the region when it's missing.
+        """
+        self._ensure_warm()
+        with self._lock:
+            region = self._regions.get(name)
+            if region is not None and (country_id is None or region["country_id"] == country_id):
+                self.hits += 1
+                return region["id"]
+            self.misses += 1
+
+        if country_id is None:
+            region_id = get_id_by_column("regions", "name", name)
+        else:
+            region_id = get_id_by_column("regions", "name", name, country_id=country_id)
+            if region_id is None and create:
+                print(f"Creating {name} region entry...")
+                region_id = insert_and_get_id("regions", {"name": name, "code": code, "country_id": country_id},
+                                              "name")
+        if region_id is not None and country_id is not None:
+            with self._lock:
+                self._regions[name] = {"id": region_id, "country_id": country_id}
+        return region_id
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._countries.clear()
+            self._regions.clear()
+            self._warmed = False
+            self._next_warm_attempt = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "countries": len(self._countries),
+                "regions": len(self._regions),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+location_ids = LocationIdCache()
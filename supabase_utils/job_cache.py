@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Approximate memory (JSON-encoded size of the cached jobs) kept before the least recently used are evicted
+JOB_CACHE_MAX_BYTES = int(os.environ.get("JOB_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Seconds a finished job stays cached after it was last read
+JOB_CACHE_TTL = float(os.environ.get("JOB_CACHE_TTL", "3600"))
+
+ACTIVE_STATUSES = ("pending", "running")
+
+
+def _estimate_size(job: Dict[str, Any]) -> int:
+    return len(json.dumps(job, default=str))
+
+
+class JobCache:
+    """
+    Bounded in-memory cache of job data in front of a JobStore.
+
+    Behaves like the dict of jobs it replaces (jobs[job_id], jobs.get(),
+    `in`), but finished jobs are evicted once unread for `ttl` seconds or,
+    least recently used first, when the cache exceeds `max_bytes`. Once
+    complete() has stored a job's results they are dropped from memory, so a
+    cached job is its status and preview; results() loads the full list from
+    the store when an export needs it. With pin_active, pending and running
+    jobs are never evicted, since the workers in this process are still
+    updating them in place.
+
+    Sizes are JSON-encoded lengths measured when a job is put or completed,
+    an estimate of (not an exact figure for) the memory it holds; code that
+    changes a cached job in place puts it again to have it re-measured, or,
+    for a job that keeps growing, grow()s it by the part it added. An
+    evicted job may still be held (and completed) by the worker running it.
+    """
+
+    def __init__(self, store, max_bytes: int = JOB_CACHE_MAX_BYTES, ttl: float = JOB_CACHE_TTL,
+                 pin_active: bool = True):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.pin_active = pin_active
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._read_at: Dict[str, float] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, job_id: str, default=None) -> Optional[Dict[str, Any]]:
+        """Returns the cached job (counting a hit or miss) without going to the store."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and self._expired(job_id, job, time.monotonic()):
+                self._drop(job_id)
+                self.expirations += 1
+                job = None
+            if job is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._jobs.move_to_end(job_id)
+            self._read_at[job_id] = time.monotonic()
+            return job
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the job from memory or, on a miss, from the store (caching it)."""
+        job = self.get(job_id)
+        if job is None:
+            job = self.store.get(job_id)
+            if job is not None:
+                self.put(job_id, job)
+        return job
+
+    def put(self, job_id: str, job: Dict[str, Any]) -> None:
+        """Caches a job, or re-measures one whose data has grown."""
+        size = _estimate_size(job)
+        with self._lock:
+            if job_id in self._jobs:
+                self._bytes -= self._sizes[job_id]
+            self._jobs[job_id] = job
+            self._jobs.move_to_end(job_id)
+            self._sizes[job_id] = size
+            self._read_at[job_id] = time.monotonic()
+            self._bytes += size
+            self._evict()
+
+    def grow(self, job_id: str, job: Dict[str, Any], part: Any) -> None:
+        """
+        Adds the size of `part`, just added to the job, to its measured size.
+        Unlike put(), only the new part is encoded; a job no longer cached is put again.
+        """
+        size = _estimate_size(part)
+        with self._lock:
+            if self._jobs.get(job_id) is job:
+                self._jobs.move_to_end(job_id)
+                self._sizes[job_id] += size
+                self._read_at[job_id] = time.monotonic()
+                self._bytes += size
+                self._evict()
+                return
+        self.put(job_id, job)
+
+    def complete(self, job_id: str, job: Dict[str, Any]) -> bool:
+        """Stores a finished job via the store, then keeps only its summary in memory."""
+        saved = self.store.complete(job_id, job)
+        # Results the store didn't take stay in memory; they can't be loaded again
+        if saved:
+            job.pop("results", None)
+        self.put(job_id, job)
+        return saved
+
+    def results(self, job_id: str) -> List[Dict[str, Any]]:
+        """A finished job's full results, loaded from the store unless still in memory."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and "results" in job:
+                return job["results"]
+        return self.store.get_results(job_id)
+
+    def pop(self, job_id: str, default=None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if job_id not in self._jobs:
+                return default
+            job = self._jobs[job_id]
+            self._drop(job_id)
+            return job
+
+    def __getitem__(self, job_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return self._jobs[job_id]
+
+    def __setitem__(self, job_id: str, job: Dict[str, Any]) -> None:
+        self.put(job_id, job)
+
+    def __contains__(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._jobs
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def _pinned(self, job: Dict[str, Any]) -> bool:
+        return self.pin_active and job.get("status") in ACTIVE_STATUSES
+
+    def _expired(self, job_id: str, job: Dict[str, Any], now: float) -> bool:
+        return not self._pinned(job) and now - self._read_at[job_id] >= self.ttl
+
+    def _drop(self, job_id: str) -> None:
+        # Caller holds the lock
+        del self._jobs[job_id]
+        del self._read_at[job_id]
+        self._bytes -= self._sizes.pop(job_id)
+
+    def _evict(self) -> None:
+        # Caller holds the lock. Entries are in read order, so the scan stops at the
+        # first one that is neither expired nor over budget; the newest is always kept.
+        now = time.monotonic()
+        bytes_left = self._bytes
+        expired, evicted = [], []
+        for job_id, job in itertools.islice(self._jobs.items(), len(self._jobs) - 1):
+            if self._pinned(job):
+                continue
+            if self._expired(job_id, job, now):
+                expired.append(job_id)
+            elif bytes_left > self.max_bytes:
+                evicted.append(job_id)
+            else:
+                break
+            bytes_left -= self._sizes[job_id]
+        for job_id in expired + evicted:
+            self._drop(job_id)
+        self.expirations += len(expired)
+        self.evictions += len(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "jobs": len(self._jobs),
+                "active": sum(1 for job in self._jobs.values() if job.get("status") in ACTIVE_STATUSES),
+                "approx_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,203 @@
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from postgrest.exceptions import APIError
+
+from supabase_utils import db_client
+
+# Columns a status poll needs; results are loaded separately with get_results()
+JOB_SUMMARY_COLUMNS = "id,status,state,city,preview,results_count,message,db_entries,error_details,created_at,updated_at"
+
+# Job fields stored as columns of the 'jobs' table
+JOB_COLUMNS = ("status", "state", "city", "preview", "results_count", "message", "db_entries", "error_details",
+               "complete")
+
+# Added by supabase_utils/sql/jobs_complete.sql; tables without it store jobs without the flag
+COMPLETE_COLUMN = "complete"
+
+
+def _is_missing_relation(error) -> bool:
+    text = str(error)
+    return ("relation" in text and "does not exist" in text) or getattr(error, "code", None) in ("42P01", "PGRST205")
+
+
+def _is_missing_column(error, column) -> bool:
+    return getattr(error, "code", None) in ("42703", "PGRST204") and column in str(error)
+
+
+def _now() -> str:
+    # Timezone-aware, so timestamptz columns store the instant rather than the host's local time
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _decode(value, default):
+    # Older rows hold JSON strings inside the JSONB columns
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return default
+    return value if value is not None else default
+
+
+def _decode_rows(rows) -> List[Tuple[str, str]]:
+    # Results are stored as [place_name, code] pairs; older jobs stored presentation dicts
+    return [(row["City/Town"], row["Post-Code"]) if isinstance(row, dict) else tuple(row) for row in rows]
+
+
+class JobStore:
+    """
+    Job persistence in the Supabase 'jobs' table, one request per transition.
+
+    create() and complete() upsert the job's summary columns, update() patches
+    only the columns that changed (status, message, ...), and complete() writes
+    the results exactly once, into the job_results table
+    (supabase_utils/sql/job_results.sql). Until that table exists, results go
+    into the jobs.results column instead. Likewise the complete flag
+    (supabase_utils/sql/jobs_complete.sql) is dropped from writes while the
+    column is missing. Every request's latency is recorded per operation and
+    reported by stats().
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+        self.results_table_available = True
+        self.complete_column_available = True
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        return self._client or db_client.get_client()
+
+    def _timed(self, operation: str, request):
+        started = time.perf_counter()
+        try:
+            return request()
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                timing = self._timings.setdefault(operation, {"count": 0, "total": 0.0, "max": 0.0})
+                timing["count"] += 1
+                timing["total"] += elapsed
+                timing["max"] = max(timing["max"], elapsed)
+
+    def _summary(self, job_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {column: job_data.get(column) for column in JOB_COLUMNS
+                if column in job_data and (column != COMPLETE_COLUMN or self.complete_column_available)}
+
+    def _upsert(self, operation: str, job_id: str, row: Dict[str, Any]) -> bool:
+        row = {"id": job_id, **row, "updated_at": _now()}
+        try:
+            try:
+                self._timed(operation, lambda: self.client.table("jobs").upsert(row, on_conflict="id").execute())
+            except APIError as e:
+                if COMPLETE_COLUMN not in row or not _is_missing_column(e, COMPLETE_COLUMN):
+                    raise
+                print("jobs.complete column not found (see supabase_utils/sql/jobs_complete.sql); "
+                      "storing jobs without it.")
+                self.complete_column_available = False
+                del row[COMPLETE_COLUMN]
+                self._timed(operation, lambda: self.client.table("jobs").upsert(row, on_conflict="id").execute())
+            return True
+        except Exception as e:
+            print(f"Failed to save job {job_id} ({operation}): {e}")
+            return False
+
+    def create(self, job_id: str, job_data: Dict[str, Any]) -> bool:
+        """Stores a new job (or replaces one with the same id) in a single upsert."""
+        return self._upsert("create", job_id, self._summary(job_data))
+
+    def update(self, job_id: str, **fields) -> bool:
+        """Patches only the given columns of an existing job, e.g. update(job_id, status="running")."""
+        unknown = set(fields) - set(JOB_COLUMNS)
+        if unknown:
+            raise ValueError(f"Not job columns: {', '.join(sorted(unknown))}")
+        patch = {**fields, "updated_at": _now()}
+        try:
+            self._timed("update", lambda: self.client.table("jobs").update(patch).eq("id", job_id).execute())
+            return True
+        except Exception as e:
+            print(f"Failed to update job {job_id}: {e}")
+            return False
+
+    def complete(self, job_id: str, job_data: Dict[str, Any]) -> bool:
+        """Stores a finished job's results once, then its final summary columns."""
+        row = self._summary(job_data)
+        results = job_data.get("results") or []
+        if results and self.results_table_available:
+            try:
+                self._timed("store_results", lambda: self.client.table("job_results").upsert(
+                    {"job_id": job_id, "results": results}, on_conflict="job_id"
+                ).execute())
+            except APIError as e:
+                if not _is_missing_relation(e):
+                    print(f"Failed to store results for job {job_id}: {e}")
+                    return False
+                print("job_results table not found (see supabase_utils/sql/job_results.sql); "
+                      "storing results in jobs.results instead.")
+                self.results_table_available = False
+            except Exception as e:
+                print(f"Failed to store results for job {job_id}: {e}")
+                return False
+        if results and not self.results_table_available:
+            row["results"] = results
+        return self._upsert("complete", job_id, row)
+
+    def delete(self, job_id: str) -> bool:
+        """Removes a job that was never accepted, e.g. one refused by a full queue."""
+        try:
+            self._timed("delete", lambda: self.client.table("jobs").delete().eq("id", job_id).execute())
+            return True
+        except Exception as e:
+            print(f"Failed to delete job {job_id}: {e}")
+            return False
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns a job's summary columns (no results), or None if it isn't stored."""
+        try:
+            response = self._timed("get", lambda: self.client.table("jobs").select(JOB_SUMMARY_COLUMNS)
+                                   .eq("id", job_id).limit(1).execute())
+        except Exception as e:
+            print(f"Failed to get job {job_id}: {e}")
+            return None
+        if not response.data:
+            return None
+        job = response.data[0]
+        job["preview"] = _decode(job.get("preview"), [])
+        return job
+
+    def get_results(self, job_id: str) -> List[Dict[str, Any]]:
+        """Loads a finished job's (place_name, code) results, from job_results or, for older jobs, jobs.results."""
+        try:
+            if self.results_table_available:
+                try:
+                    response = self._timed("get_results", lambda: self.client.table("job_results").select("results")
+                                           .eq("job_id", job_id).limit(1).execute())
+                    if response.data:
+                        return _decode_rows(_decode(response.data[0]["results"], []))
+                except APIError as e:
+                    if not _is_missing_relation(e):
+                        raise
+                    self.results_table_available = False
+            response = self._timed("get_results", lambda: self.client.table("jobs").select("results")
+                                   .eq("id", job_id).limit(1).execute())
+            return _decode_rows(_decode(response.data[0].get("results"), [])) if response.data else []
+        except Exception as e:
+            print(f"Failed to get results for job {job_id}: {e}")
+            return []
+
+    def stats(self) -> Dict[str, Any]:
+        """Request count and latency per operation, in milliseconds."""
+        with self._lock:
+            return {
+                operation: {
+                    "count": timing["count"],
+                    "avg_ms": round(timing["total"] / timing["count"] * 1000, 1),
+                    "max_ms": round(timing["max"] * 1000, 1),
+                }
+                for operation, timing in self._timings.items()
+            }
@@ -0,0 +1,12 @@
+-- Finished job results, written once per job by JobStore.complete().
+-- Keeps the jobs rows small: status polls never read the results array.
+-- Apply in the Supabase SQL editor, or locally on top of local_schema.sql:
+--   psql -d postcodes -f local_schema.sql -f job_results.sql
+
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id UUID PRIMARY KEY,
+    results JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+GRANT SELECT, INSERT, UPDATE ON job_results TO anon, authenticated;
@@ -0,0 +1,10 @@
+-- Marks whole-state jobs whose scrape read every listing page and stored
+-- every row. City lookups are only answered from stored postcodes when such
+-- a job finished within CITY_INDEX_TTL (see load_fresh_state_rows in app.py).
+-- Apply in the Supabase SQL editor, or locally on top of local_schema.sql:
+--   psql -d postcodes -f local_schema.sql -f jobs_complete.sql
+
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS complete BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE INDEX IF NOT EXISTS jobs_complete_state_updated_at
+    ON jobs (state, updated_at DESC) WHERE complete;
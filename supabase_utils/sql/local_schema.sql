@@ -0,0 +1,53 @@
+-- Local Postgres stand-in for the Supabase tables the app relies on.
+-- Lets the SQL in this directory be tried without a Supabase project:
+--   createdb postcodes && psql -d postcodes -f local_schema.sql
+-- test_region_counts.py applies it, with postcode_counts_by_region.sql, when
+-- LOCAL_POSTGRES_DSN points at a local Postgres.
+
+DO $$
+BEGIN
+    -- Roles PostgREST/Supabase grant to; created here so GRANTs apply locally
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+        CREATE ROLE anon NOLOGIN;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'authenticated') THEN
+        CREATE ROLE authenticated NOLOGIN;
+    END IF;
+END
+$$;
+
+CREATE TABLE IF NOT EXISTS countries (
+    id BIGSERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL UNIQUE,
+    code VARCHAR(10)
+);
+
+CREATE TABLE IF NOT EXISTS regions (
+    id BIGSERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL UNIQUE,
+    code VARCHAR(10),
+    country_id BIGINT REFERENCES countries (id)
+);
+
+CREATE TABLE IF NOT EXISTS postcodes (
+    id BIGSERIAL PRIMARY KEY,
+    code VARCHAR(20) NOT NULL UNIQUE,
+    place_name VARCHAR(200) NOT NULL,
+    region_id BIGINT NOT NULL REFERENCES regions (id)
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id UUID PRIMARY KEY,
+    status VARCHAR(50) NOT NULL,
+    state VARCHAR(100) NOT NULL,
+    city VARCHAR(100),
+    results JSONB,
+    preview JSONB,
+    results_count INTEGER DEFAULT 0,
+    message TEXT,
+    db_entries INTEGER DEFAULT 0,
+    error_details TEXT,
+    complete BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
@@ -0,0 +1,19 @@
+-- Per-region postcode counts in one query.
+-- Used by get_postcode_counts_by_region() for /database-stats and /job/<id>.
+-- Apply in the Supabase SQL editor, or locally on top of local_schema.sql:
+--   psql -d postcodes -f local_schema.sql -f postcode_counts_by_region.sql
+
+CREATE OR REPLACE VIEW postcode_counts_by_region AS
+SELECT
+    r.id AS region_id,
+    r.name AS region_name,
+    COUNT(p.id) AS postcode_count
+FROM regions r
+LEFT JOIN postcodes p ON p.region_id = r.id
+GROUP BY r.id, r.name;
+
+-- The join and the count both walk postcodes by region_id
+CREATE INDEX IF NOT EXISTS postcodes_region_id_idx ON postcodes (region_id);
+
+-- PostgREST only exposes views the API roles can read
+GRANT SELECT ON postcode_counts_by_region TO anon, authenticated;
@@ -0,0 +1,100 @@
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# Seconds a stats snapshot is served before it is recomputed from the database
+STATS_CACHE_TTL = float(os.environ.get("STATS_CACHE_TTL", "60"))
+
+# Number of recent entries kept in a snapshot
+RECENT_ENTRIES = 5
+
+
+class StatsCache:
+    """
+    TTL cache for the database stats snapshot.
+
+    Reads return the current snapshot without copying it: every update builds
+    a new dict (copy-on-write), so callers must treat it as read-only. When
+    the snapshot expires exactly one caller recomputes it (single flight);
+    concurrent readers keep getting the stale snapshot until it lands, and
+    only block when there is nothing to serve yet. Scrape jobs fold their
+    committed rows in with apply_commit() so the counts stay current between
+    refreshes.
+    """
+
+    def __init__(self, loader: Callable[[], Dict[str, Any]], ttl: float = STATS_CACHE_TTL):
+        self.loader = loader
+        self.ttl = ttl
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._loaded_at = 0.0
+        self._refreshing = False
+        self._cond = threading.Condition()
+        self.hits = 0
+        self.refreshes = 0
+
+    def get(self) -> Dict[str, Any]:
+        with self._cond:
+            if self._snapshot is not None and time.monotonic() - self._loaded_at < self.ttl:
+                self.hits += 1
+                return self._snapshot
+            if self._refreshing:
+                if self._snapshot is not None:
+                    self.hits += 1
+                    return self._snapshot
+                while self._refreshing:
+                    self._cond.wait()
+                if self._snapshot is not None:
+                    return self._snapshot
+            self._refreshing = True
+
+        snapshot = None
+        try:
+            snapshot = self.loader()
+            return snapshot
+        finally:
+            with self._cond:
+                self._refreshing = False
+                # Failed loads (marked with "error") are returned but never cached
+                if snapshot is not None and "error" not in snapshot:
+                    self._snapshot = snapshot
+                    self._loaded_at = time.monotonic()
+                    self.refreshes += 1
+                self._cond.notify_all()
+
+    def apply_commit(self, region_name: str, inserted: int, recent_entries: Optional[List[Dict[str, Any]]] = None,
+                     deleted: int = 0) -> None:
+        """
+        Folds a scrape job's committed rows into the cached snapshot.
+
+        Args:
+            region_name: The region (state) the rows were written to
+            inserted: Rows newly inserted by the job
+            recent_entries: Newest inserted entries, already in display format, oldest first
+            deleted: Rows the job removed
+        """
+        delta = inserted - deleted
+        with self._cond:
+            if self._snapshot is None or (not delta and not recent_entries):
+                return
+            snapshot = dict(self._snapshot)
+            snapshot["total_postcodes"] = max(0, snapshot.get("total_postcodes", 0) + delta)
+            region_counts = dict(snapshot.get("region_counts", {}))
+            region_counts[region_name] = max(0, region_counts.get(region_name, 0) + delta)
+            snapshot["region_counts"] = region_counts
+            if recent_entries:
+                snapshot["recent_entries"] = (list(snapshot.get("recent_entries", [])) + recent_entries)[-RECENT_ENTRIES:]
+            self._snapshot = snapshot
+
+    def invalidate(self) -> None:
+        with self._cond:
+            self._loaded_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "hits": self.hits,
+                "refreshes": self.refreshes,
+                "age": round(time.monotonic() - self._loaded_at, 1) if self._snapshot is not None else None,
+                "ttl": self.ttl,
+            }
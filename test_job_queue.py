@@ -0,0 +1,194 @@
+"""
+Offline tests for the SQLite job queue and the worker pool.
+
+Each test gets its own queue file under pytest's tmp_path.
+Run with: python -m pytest test_job_queue.py
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import subprocess
+
+import pytest
+
+from worker.job_queue import JobQueue, QueueFullError
+from worker.pool import WorkerPool
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    def make(**options):
+        return JobQueue(str(tmp_path / "queue" / "job_queue.db"), **options)
+    return make
+
+
+def set_column(queue, job_id, **values):
+    conn = sqlite3.connect(queue.path)
+    try:
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        conn.execute(f"UPDATE queue_jobs SET {assignments} WHERE id = ?", [*values.values(), job_id])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_queue_file_is_created_on_first_use(make_queue, tmp_path):
+    queue = make_queue()
+    assert not (tmp_path / "queue").exists()
+    queue.enqueue("a", "scrape", {"state": "Ohio"})
+    assert os.path.exists(queue.path)
+
+
+def test_jobs_are_claimed_in_order_with_their_payload(make_queue):
+    queue = make_queue()
+    assert queue.enqueue("a", "scrape", {"state": "Ohio"}) == "a"
+    queue.enqueue("b", "scrape", {"state": "Iowa"})
+    first = queue.claim("worker-1")
+    second = queue.claim("worker-2")
+    assert (first["id"], first["payload"], first["status"]) == ("a", {"state": "Ohio"}, "queued")
+    assert second["id"] == "b"
+    assert queue.claim("worker-1") is None
+    assert queue.get("a")["status"] == "running"
+    assert queue.get("a")["worker"] == "worker-1"
+    assert first["wait_seconds"] >= 0
+
+
+def test_full_queue_refuses_new_jobs(make_queue):
+    queue = make_queue(max_depth=2)
+    queue.enqueue("a", "scrape", {}, dedupe_key="ohio|")
+    queue.enqueue("b", "scrape", {})
+    with pytest.raises(QueueFullError) as error:
+        queue.enqueue("c", "scrape", {})
+    assert (error.value.depth, error.value.max_depth) == (2, 2)
+    assert queue.get("c") is None
+
+    # Coalesced jobs never reach a worker, so they are accepted at full depth
+    assert queue.enqueue("d", "scrape", {}, dedupe_key="ohio|") == "a"
+
+    # Running jobs no longer count towards the depth
+    queue.claim("worker-1")
+    assert queue.enqueue("c", "scrape", {}) == "c"
+
+
+def test_identical_jobs_coalesce_onto_the_one_in_flight(make_queue):
+    queue = make_queue()
+    assert queue.enqueue("leader", "scrape", {}, dedupe_key="ohio|") == "leader"
+    assert queue.enqueue("follower", "scrape", {}, dedupe_key="ohio|") == "leader"
+    assert queue.enqueue("other", "scrape", {}, dedupe_key="iowa|") == "other"
+    assert queue.get("follower")["status"] == "coalesced"
+    assert queue.followers("leader") == ["follower"]
+
+    queue.claim("worker-1")
+    assert queue.enqueue("late", "scrape", {}, dedupe_key="ohio|") == "leader"
+
+    queue.finish("leader")
+    assert queue.get("follower")["status"] == "done"
+    assert queue.get("late")["status"] == "done"
+
+
+def test_finished_jobs_are_reused_within_the_coalesce_window(make_queue):
+    queue = make_queue(coalesce_window=60)
+    queue.enqueue("leader", "scrape", {}, dedupe_key="ohio|")
+    queue.claim("worker-1")
+    queue.finish("leader")
+    assert queue.enqueue("again", "scrape", {}, dedupe_key="ohio|") == "leader"
+    assert queue.get("again")["status"] == "done"
+
+    set_column(queue, "leader", finished_at=time.time() - 120)
+    assert queue.enqueue("later", "scrape", {}, dedupe_key="ohio|") == "later"
+
+
+def test_failed_jobs_are_not_reused_and_fail_their_followers(make_queue):
+    queue = make_queue()
+    queue.enqueue("leader", "scrape", {}, dedupe_key="ohio|")
+    queue.enqueue("follower", "scrape", {}, dedupe_key="ohio|")
+    queue.claim("worker-1")
+    queue.finish("leader", error="boom")
+    assert queue.get("follower")["status"] == "failed"
+    assert queue.enqueue("retry", "scrape", {}, dedupe_key="ohio|") == "retry"
+
+
+def test_crashed_running_jobs_are_requeued_then_failed(make_queue):
+    queue = make_queue(stale_after=30, max_attempts=2)
+    queue.enqueue("a", "scrape", {}, dedupe_key="ohio|")
+    queue.enqueue("follower", "scrape", {}, dedupe_key="ohio|")
+
+    # A worker claimed the job and stopped heartbeating
+    queue.claim("worker-1")
+    assert queue.recover_stale() == 0
+    set_column(queue, "a", heartbeat_at=time.time() - 60)
+    assert queue.recover_stale() == 1
+    assert queue.get("a")["status"] == "queued"
+    assert queue.get("a")["worker"] is None
+
+    # Its second attempt dies too: no more attempts, and the follower fails with it
+    assert queue.claim("worker-2")["attempts"] == 1
+    set_column(queue, "a", heartbeat_at=time.time() - 60)
+    assert queue.recover_stale() == 0
+    assert queue.get("a")["status"] == "failed"
+    assert queue.get("a")["error"] == "worker stopped responding"
+    assert queue.get("follower")["status"] == "failed"
+
+
+def test_heartbeats_keep_running_jobs_alive(make_queue):
+    queue = make_queue(stale_after=30)
+    queue.enqueue("a", "scrape", {})
+    queue.claim("worker-1")
+    set_column(queue, "a", heartbeat_at=time.time() - 60)
+    queue.heartbeat(["a"])
+    assert queue.recover_stale() == 0
+    assert queue.get("a")["status"] == "running"
+
+
+def test_stats_report_depth_and_waits(make_queue):
+    queue = make_queue(max_depth=5)
+    queue.enqueue("a", "scrape", {}, dedupe_key="ohio|")
+    queue.enqueue("b", "scrape", {}, dedupe_key="ohio|")
+    queue.enqueue("c", "scrape", {})
+    queue.claim("worker-1")
+    stats = queue.stats()
+    assert (stats["depth"], stats["max_depth"], stats["running"], stats["coalesced"]) == (1, 5, 1, 1)
+    assert stats["avg_wait_seconds"] is not None
+
+
+def test_worker_pool_runs_handlers_and_records_outcomes(make_queue):
+    queue = make_queue()
+    seen = []
+
+    def scrape(job_id, payload):
+        seen.append((job_id, payload))
+        if payload.get("fail"):
+            raise RuntimeError("scrape failed")
+
+    queue.enqueue("ok", "scrape", {"state": "Ohio"})
+    queue.enqueue("bad", "scrape", {"fail": True})
+    pool = WorkerPool(queue, {"scrape": scrape}, size=1)
+    pool.start()
+    pool.start()
+    assert len(pool._threads) == 2  # one worker and the heartbeat, started once
+    try:
+        deadline = time.time() + 10
+        while queue.stats()["done"] + queue.stats()["failed"] < 2 and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        pool.stop(timeout=5)
+    assert seen == [("ok", {"state": "Ohio"}), ("bad", {"fail": True})]
+    assert queue.get("ok")["status"] == "done"
+    assert queue.get("bad")["status"] == "failed"
+    assert "scrape failed" in queue.get("bad")["error"]
+
+
+def test_importing_app_starts_no_workers_and_writes_no_files(tmp_path):
+    script = ("import threading, app; "
+              "print(sorted(t.name for t in threading.enumerate() if t.name.startswith('job-')))")
+    env = dict(os.environ, PYTHONPATH=ROOT, RUN_INPROCESS_WORKERS="1", SCRAPER_DATA_DIR=str(tmp_path / "data"))
+    env.pop("JOB_QUEUE_PATH", None)
+    result = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+    assert sorted(os.listdir(tmp_path)) == []
@@ -0,0 +1,166 @@
+"""
+Offline tests for JobStore: the requests each job transition costs.
+
+The Supabase client is replaced by a recorder that answers every query
+locally, so this runs without a project. Run with: python -m pytest test_job_store.py
+"""
+
+from datetime import datetime
+
+from postgrest.exceptions import APIError
+
+from supabase_utils.job_store import JobStore
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    """Records the chained builder calls of one request until execute()."""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return call
+
+    def execute(self):
+        self.client.requests.append((self.table, self.calls))
+        error = self.client.errors.get(self.table)
+        if callable(error):
+            error = error(self.calls)
+        if error is not None:
+            raise error
+        return FakeResponse(self.client.rows.get(self.table, []))
+
+
+class FakeClient:
+    def __init__(self):
+        self.requests = []
+        self.rows = {}
+        self.errors = {}
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def new_job():
+    return {"status": "pending", "state": "Ohio", "city": None, "results": [], "preview": [],
+            "results_count": 0, "message": None, "db_entries": 0}
+
+
+def finished_job(row_count=1000):
+    job = new_job()
+    results = [("Town", f"{i:05d}") for i in range(row_count)]
+    job.update(status="completed", results=results, preview=results[:5], results_count=row_count,
+               message=f"Found {row_count} postcodes for Ohio")
+    return job
+
+
+def test_create_is_one_upsert_without_results():
+    client = FakeClient()
+    store = JobStore(client)
+    assert store.create("job-1", new_job())
+    assert len(client.requests) == 1
+    table, calls = client.requests[0]
+    assert table == "jobs"
+    assert calls[0][0] == "upsert"
+    assert "results" not in calls[0][1][0]
+
+
+def test_update_is_one_patch_of_the_given_columns():
+    client = FakeClient()
+    store = JobStore(client)
+    assert store.update("job-1", status="running")
+    assert len(client.requests) == 1
+    table, calls = client.requests[0]
+    assert table == "jobs"
+    assert calls[0][0] == "update"
+    assert set(calls[0][1][0]) == {"status", "updated_at"}
+
+
+def test_complete_writes_results_once_then_the_summary():
+    client = FakeClient()
+    store = JobStore(client)
+    assert store.complete("job-1", finished_job())
+    assert [table for table, _ in client.requests] == ["job_results", "jobs"]
+    summary = client.requests[1][1][0][1][0]
+    assert "results" not in summary
+    assert summary["status"] == "completed"
+
+
+def test_full_lifecycle_costs_four_requests():
+    client = FakeClient()
+    store = JobStore(client)
+    store.create("job-1", new_job())
+    store.update("job-1", status="running")
+    store.complete("job-1", finished_job())
+    assert len(client.requests) == 4
+
+
+def test_each_transition_latency_is_recorded():
+    client = FakeClient()
+    store = JobStore(client)
+    store.create("job-1", new_job())
+    store.update("job-1", status="running")
+    store.complete("job-1", finished_job())
+    stats = store.stats()
+    assert {operation: timing["count"] for operation, timing in stats.items()} == {
+        "create": 1, "update": 1, "store_results": 1, "complete": 1,
+    }
+    assert all(timing["avg_ms"] >= 0 and timing["max_ms"] >= timing["avg_ms"] for timing in stats.values())
+
+
+def test_complete_falls_back_to_the_jobs_table_without_job_results():
+    client = FakeClient()
+    client.errors["job_results"] = APIError({"code": "42P01", "message": 'relation "job_results" does not exist'})
+    store = JobStore(client)
+    assert store.complete("job-1", finished_job(10))
+    assert [table for table, _ in client.requests] == ["job_results", "jobs"]
+    assert len(client.requests[1][1][0][1][0]["results"]) == 10
+
+    # Once the table is known to be missing, completion is a single request
+    client.requests.clear()
+    assert store.complete("job-2", finished_job(10))
+    assert [table for table, _ in client.requests] == ["jobs"]
+
+
+def test_timestamps_are_written_in_utc():
+    client = FakeClient()
+    store = JobStore(client)
+    store.create("job-1", new_job())
+    store.update("job-1", status="running")
+    for _, calls in client.requests:
+        updated_at = datetime.fromisoformat(calls[0][1][0]["updated_at"])
+        assert updated_at.utcoffset().total_seconds() == 0
+
+
+def test_complete_flag_is_dropped_while_the_column_is_missing():
+    client = FakeClient()
+    missing = APIError({"code": "PGRST204", "message": "Could not find the 'complete' column of 'jobs'"})
+    client.errors["jobs"] = lambda calls: missing if "complete" in calls[0][1][0] else None
+    store = JobStore(client)
+    job = finished_job(10)
+    job["complete"] = True
+    assert store.complete("job-1", job)
+    assert [table for table, _ in client.requests] == ["job_results", "jobs", "jobs"]
+    assert "complete" not in client.requests[-1][1][0][1][0]
+
+    # Later jobs are stored without the flag straight away
+    client.requests.clear()
+    assert store.complete("job-2", job)
+    assert [table for table, _ in client.requests] == ["job_results", "jobs"]
+
+
+def test_results_are_read_back_as_pairs():
+    client = FakeClient()
+    client.rows["job_results"] = [{"results": [["Akron", "44301"], {"City/Town": "Dayton", "Post-Code": "45402"}]}]
+    store = JobStore(client)
+    assert store.get_results("job-1") == [("Akron", "44301"), ("Dayton", "45402")]
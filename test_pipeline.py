@@ -0,0 +1,136 @@
+"""
+Offline tests for the diff-based postcode writes (RowPipeline and
+finish_state_pipeline): what is written, and when stored codes are deleted.
+
+The database functions the pipeline calls are replaced by a recorder that
+holds one region's rows in memory. Run with: python -m pytest test_pipeline.py
+"""
+
+import pytest
+
+from scraper import pipeline as pipeline_module
+from scraper import geonames_scraper
+from scraper.geonames_scraper import finish_state_pipeline, record_pagination
+from scraper.pipeline import RowPipeline
+from scraper.row_parser import PostcodeRow
+
+REGION_ID = 7
+
+
+class FakeDb:
+    """Stands in for get_region_postcodes, upsert_postcodes_bulk and delete_postcodes."""
+
+    def __init__(self, stored=(), load_error=None):
+        self.stored = [{"id": index, "code": code, "place_name": place_name}
+                       for index, (place_name, code) in enumerate(stored, start=1)]
+        self.load_error = load_error
+        self.upserts = []
+        self.deletes = []
+
+    def get_region_postcodes(self, region_id):
+        assert region_id == REGION_ID
+        if self.load_error is not None:
+            raise self.load_error
+        return list(self.stored)
+
+    def upsert_postcodes_bulk(self, rows, region_id, chunk_size, ignore_duplicates):
+        self.upserts.append((list(rows), ignore_duplicates))
+        return [{"chunk": 0, "sent": len(rows), "success": len(rows), "conflicts": 0, "error": None,
+                 "recent": []}]
+
+    def delete_postcodes(self, ids, chunk_size):
+        self.deletes.append(list(ids))
+        return len(ids)
+
+
+@pytest.fixture
+def make_db(monkeypatch):
+    def make(stored=(), load_error=None):
+        db = FakeDb(stored, load_error)
+        for name in ("get_region_postcodes", "upsert_postcodes_bulk", "delete_postcodes"):
+            monkeypatch.setattr(pipeline_module, name, getattr(db, name))
+        return db
+    monkeypatch.setattr(geonames_scraper.city_indexes, "put", lambda state, rows: None)
+    return make
+
+
+def rows(*pairs):
+    return [PostcodeRow(place_name, code) for place_name, code in pairs]
+
+
+STORED = rows(("Akron", "44301"), ("Dayton", "45402"), ("Old Town", "45999"))
+SCRAPED = rows(("Akron", "44301"), ("Dayton", "45402"))
+
+
+def run_pipeline(pages, city_filter=None, complete_pagination=True):
+    pipeline = RowPipeline(REGION_ID, city_filter)
+    for page in pages:
+        pipeline.put(page)
+    report = {}
+    record_pagination(report, 1, [len(page) for page in pages], [] if complete_pagination else ["page-2"])
+    return pipeline, report, finish_state_pipeline("Ohio", pipeline, city_filter, report)
+
+
+def test_missing_codes_are_deleted_after_a_complete_scrape(make_db):
+    db = make_db(STORED)
+    _, report, _ = run_pipeline([SCRAPED])
+    assert db.deletes == [[3]]
+    assert report["changes"]["deleted"] == 1
+    assert report["complete"]
+
+
+def test_missing_codes_are_kept_after_an_incomplete_scrape(make_db):
+    db = make_db(STORED)
+    _, report, _ = run_pipeline([SCRAPED], complete_pagination=False)
+    assert db.deletes == []
+    assert report["changes"]["deletes_skipped"] == 1
+    assert not report["complete"]
+
+
+def test_missing_codes_are_kept_for_a_city_filtered_scrape(make_db):
+    db = make_db(STORED)
+    _, report, results = run_pipeline([SCRAPED], city_filter="akron")
+    assert results == rows(("Akron", "44301"))
+    assert db.deletes == []
+    assert not report["complete"]
+
+
+def test_missing_codes_are_kept_unless_finish_is_told_the_scrape_was_complete(make_db):
+    db = make_db(STORED)
+    pipeline = RowPipeline(REGION_ID)
+    pipeline.put(SCRAPED)
+    pipeline.finish(complete=False)
+    assert db.deletes == []
+    assert pipeline.deletes_skipped == 1
+
+
+def test_a_failed_load_writes_nothing_and_raises(make_db):
+    db = make_db(STORED, load_error=RuntimeError("load failed"))
+    pipeline = RowPipeline(REGION_ID)
+    pipeline.put(SCRAPED)
+    pipeline.put(rows(("New Town", "45000")))
+    with pytest.raises(RuntimeError, match="load failed"):
+        pipeline.finish(complete=True)
+    assert db.upserts == []
+    assert db.deletes == []
+
+
+def test_unchanged_rows_are_not_written_again(make_db):
+    db = make_db(STORED)
+    scraped = rows(("Akron", "44301"), ("Dayton City", "45402"), ("New Town", "45000"), ("Old Town", "45999"))
+    _, report, _ = run_pipeline([scraped[:2], scraped[2:]])
+    # New codes are inserted, renamed ones updated; the two batches may be written in either order
+    assert sorted(db.upserts, key=lambda upsert: upsert[1]) == [
+        (rows(("Dayton City", "45402")), False), (rows(("New Town", "45000")), True),
+    ]
+    assert report["changes"]["unchanged"] == 2
+    assert db.deletes == []
+
+
+def test_an_unchanged_region_costs_no_writes(make_db):
+    db = make_db(STORED)
+    _, report, results = run_pipeline([STORED])
+    assert results == STORED
+    assert db.upserts == []
+    assert db.deletes == []
+    assert report["changes"]["unchanged"] == len(STORED)
@@ -0,0 +1,148 @@
+"""
+Tests the grouped region count view against a local Postgres.
+
+Applies supabase_utils/sql/local_schema.sql and postcode_counts_by_region.sql
+in a throwaway schema, then checks get_postcode_counts_by_region() (one
+query on the view) against the per-region exact counts it falls back to.
+The database client is replaced by a small PostgREST stand-in that runs
+the same select/eq/limit queries as SQL.
+
+    LOCAL_POSTGRES_DSN=postgresql://localhost/postgres python -m pytest test_region_counts.py
+
+Skipped when LOCAL_POSTGRES_DSN is unset or psycopg2 isn't installed.
+"""
+
+import os
+import uuid
+
+import pytest
+
+from postgrest.exceptions import APIError
+
+from supabase_utils import db_client
+
+psycopg2 = pytest.importorskip("psycopg2")
+LOCAL_POSTGRES_DSN = os.environ.get("LOCAL_POSTGRES_DSN")
+pytestmark = pytest.mark.skipif(not LOCAL_POSTGRES_DSN, reason="LOCAL_POSTGRES_DSN is not set")
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "supabase_utils", "sql")
+
+REGION_SIZES = {"Ohio": 7, "Iowa": 3, "Utah": 1, "Maine": 0}
+
+
+class SqlResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class SqlQuery:
+    """The select().eq().limit().execute() chains db_client builds, run as SQL."""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.columns = "*"
+        self.count = None
+        self.filters = []
+        self.row_limit = None
+
+    def select(self, columns, count=None):
+        self.columns = columns
+        self.count = count
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def limit(self, row_limit):
+        self.row_limit = row_limit
+        return self
+
+    def execute(self):
+        if self.table in self.client.missing:
+            raise APIError({"code": "PGRST205", "message": f"relation {self.table} does not exist"})
+        where = " AND ".join(f"{column} = %s" for column, _ in self.filters) or "TRUE"
+        values = [value for _, value in self.filters]
+        with self.client.conn.cursor() as cursor:
+            sql = f"SELECT {self.columns} FROM {self.table} WHERE {where}"
+            cursor.execute(sql + (f" LIMIT {int(self.row_limit)}" if self.row_limit else ""), values)
+            names = [column.name for column in cursor.description]
+            data = [dict(zip(names, row)) for row in cursor.fetchall()]
+            count = None
+            if self.count:
+                cursor.execute(f"SELECT COUNT(*) FROM {self.table} WHERE {where}", values)
+                count = cursor.fetchone()[0]
+        self.client.requests += 1
+        return SqlResponse(data, count)
+
+
+class SqlClient:
+    def __init__(self, conn):
+        self.conn = conn
+        self.requests = 0
+        self.missing = set()
+
+    def table(self, name):
+        return SqlQuery(self, name)
+
+
+@pytest.fixture
+def database():
+    conn = psycopg2.connect(LOCAL_POSTGRES_DSN)
+    conn.autocommit = True
+    schema = f"region_counts_{uuid.uuid4().hex[:8]}"
+    with conn.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA {schema}")
+        cursor.execute(f"SET search_path TO {schema}")
+        for name in ("local_schema.sql", "postcode_counts_by_region.sql"):
+            with open(os.path.join(SQL_DIR, name), encoding="utf-8") as f:
+                cursor.execute(f.read())
+        cursor.execute("INSERT INTO countries (name, code) VALUES ('USA', 'US') RETURNING id")
+        country_id = cursor.fetchone()[0]
+        code = 0
+        for region, size in REGION_SIZES.items():
+            cursor.execute("INSERT INTO regions (name, country_id) VALUES (%s, %s) RETURNING id", (region, country_id))
+            region_id = cursor.fetchone()[0]
+            for _ in range(size):
+                code += 1
+                cursor.execute("INSERT INTO postcodes (code, place_name, region_id) VALUES (%s, %s, %s)",
+                               (f"{code:05d}", f"{region} Town", region_id))
+    try:
+        yield conn
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.close()
+
+
+@pytest.fixture
+def client(database, monkeypatch):
+    client = SqlClient(database)
+    monkeypatch.setattr(db_client, "get_client", lambda: client)
+    return client
+
+
+def test_view_counts_every_region_in_one_request(client):
+    counts = db_client.get_postcode_counts_by_region()
+    assert counts == REGION_SIZES
+    assert client.requests == 1
+
+
+def test_view_matches_the_per_region_counts(client):
+    grouped = db_client.get_postcode_counts_by_region()
+    client.missing.add("postcode_counts_by_region")
+    client.requests = 0
+    per_region = db_client.get_postcode_counts_by_region()
+    assert per_region == grouped
+    # The fallback costs one request to list the regions and one count per region
+    assert client.requests == 1 + len(REGION_SIZES)
+
+
+def test_view_follows_inserts(client, database):
+    with database.cursor() as cursor:
+        cursor.execute("INSERT INTO postcodes (code, place_name, region_id) "
+                       "SELECT '99999', 'New Town', id FROM regions WHERE name = 'Maine'")
+    assert db_client.get_postcode_counts_by_region()["Maine"] == 1
+    assert db_client.count_postcodes() == sum(REGION_SIZES.values()) + 1
@@ -24,7 +24,7 @@ def test_scraper(state_name, city_filter=None):
         print(f"\nScraper returned {len(results)} results")
         print("\nFirst 5 results:")
         for i, result in enumerate(results[:5]):
-            print(f"{i+1}. {result.get('place_name', 'N/A')} - {result.get('code', 'N/A')}")
+            print(f"{i+1}. {result.place_name} - {result.code}")
     
     print("-" * 50)
     return results
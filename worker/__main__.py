@@ -0,0 +1,36 @@
+"""
+Standalone job worker, for running scrapes outside the web process.
+
+Usage:
+    RUN_INPROCESS_WORKERS=0 gunicorn app:app ...   # web only enqueues
+    python -m worker                                # drains the shared queue
+"""
+import os
+import sys
+import signal
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def main():
+    # Importing app registers the job handlers; it doesn't start the web server,
+    # and with in-process workers switched off it doesn't start a second pool either
+    os.environ["RUN_INPROCESS_WORKERS"] = "0"
+    from app import job_queue, JOB_HANDLERS
+    from worker.pool import WorkerPool
+
+    pool = WorkerPool(job_queue, JOB_HANDLERS)
+    stopped = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopped.set())
+
+    pool.start()
+    stopped.wait()
+    print("Stopping worker pool, waiting for running jobs...")
+    pool.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
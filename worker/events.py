@@ -0,0 +1,103 @@
+import os
+import time
+import queue
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+# Events buffered per subscriber; progress events are dropped when a client falls behind
+JOB_EVENT_BUFFER = int(os.environ.get("JOB_EVENT_BUFFER", "100"))
+# Seconds a finished job's last event is kept for subscribers that connect late
+JOB_EVENT_RETENTION = float(os.environ.get("JOB_EVENT_RETENTION", "600"))
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def is_terminal(event: Dict[str, Any]) -> bool:
+    return event.get("type") == "status" and event.get("status") in TERMINAL_STATUSES
+
+
+class JobEventBus:
+    """
+    In-process pub/sub for job updates.
+
+    publish() fans an event out to every subscriber of the job and keeps it
+    as the job's latest status or progress event, so a subscriber that
+    connects mid-job starts from the current state. Events are dicts with a
+    "type" of "status" or "progress"; a status event for a completed or
+    failed job is the last one a subscriber needs.
+    """
+
+    def __init__(self, buffer=JOB_EVENT_BUFFER, retention=JOB_EVENT_RETENTION):
+        self.buffer = buffer
+        self.retention = retention
+        self._subscribers: Dict[str, set] = {}
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._finished_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, job_id: str, event: Dict[str, Any]) -> None:
+        with self._lock:
+            latest = self._latest.setdefault(job_id, {})
+            latest[event["type"]] = event
+            if is_terminal(event):
+                self._finished_at[job_id] = time.monotonic()
+            subscribers = list(self._subscribers.get(job_id, ()))
+            self._prune()
+        for subscription in subscribers:
+            self._deliver(subscription, event)
+
+    @staticmethod
+    def _deliver(subscription: "queue.Queue", event: Dict[str, Any]) -> None:
+        try:
+            subscription.put_nowait(event)
+        except queue.Full:
+            if not is_terminal(event):
+                return
+            # A slow client can miss progress, never the final status
+            try:
+                subscription.get_nowait()
+            except queue.Empty:
+                pass
+            subscription.put_nowait(event)
+
+    def subscribe(self, job_ids: Iterable[str]) -> "queue.Queue":
+        """
+        Returns a queue receiving every event published for any of job_ids,
+        starting with the latest status and progress already published.
+        """
+        subscription = queue.Queue(maxsize=self.buffer)
+        with self._lock:
+            for job_id in job_ids:
+                self._subscribers.setdefault(job_id, set()).add(subscription)
+                latest = self._latest.get(job_id, {})
+                for event_type in ("status", "progress"):
+                    if event_type in latest:
+                        self._deliver(subscription, latest[event_type])
+        return subscription
+
+    def unsubscribe(self, job_ids: Iterable[str], subscription: "queue.Queue") -> None:
+        with self._lock:
+            for job_id in job_ids:
+                subscribers = self._subscribers.get(job_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[job_id]
+
+    def latest(self, job_id: str, event_type: str = "status") -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._latest.get(job_id, {}).get(event_type)
+
+    def _prune(self) -> None:
+        # Caller holds the lock
+        cutoff = time.monotonic() - self.retention
+        for job_id in [job_id for job_id, finished in self._finished_at.items() if finished < cutoff]:
+            del self._finished_at[job_id]
+            self._latest.pop(job_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "jobs": len(self._latest),
+                "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            }
@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+# Directory for the local state files of the web process and its workers
+SCRAPER_DATA_DIR = os.environ.get("SCRAPER_DATA_DIR", "data")
+# SQLite file shared by the web process and any standalone workers
+JOB_QUEUE_PATH = os.environ.get("JOB_QUEUE_PATH", os.path.join(SCRAPER_DATA_DIR, "job_queue.db"))
+# Queued jobs allowed before /scrape starts refusing work
+JOB_QUEUE_MAX_DEPTH = int(os.environ.get("JOB_QUEUE_MAX_DEPTH", "20"))
+# A running job whose worker hasn't sent a heartbeat for this long is requeued
+JOB_STALE_AFTER = float(os.environ.get("JOB_STALE_AFTER", "120"))
+# Attempts before an interrupted job is marked failed instead of requeued
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "2"))
+# Finished jobs are kept this many seconds for wait-time stats, then pruned
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", str(7 * 24 * 3600)))
+# A new job reuses a finished job with the same dedupe key for this many seconds
+JOB_COALESCE_WINDOW = float(os.environ.get("JOB_COALESCE_WINDOW", "300"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue_jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL,
+    worker TEXT,
+    error TEXT,
+    dedupe_key TEXT,
+    leader_id TEXT
+);
+CREATE INDEX IF NOT EXISTS queue_jobs_status_idx ON queue_jobs (status, enqueued_at);
+"""
+
+# Columns added after the first release, created on queue files that predate them
+MIGRATIONS = {
+    "dedupe_key": "ALTER TABLE queue_jobs ADD COLUMN dedupe_key TEXT",
+    "leader_id": "ALTER TABLE queue_jobs ADD COLUMN leader_id TEXT",
+}
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS queue_jobs_dedupe_idx ON queue_jobs (dedupe_key, status);
+CREATE INDEX IF NOT EXISTS queue_jobs_leader_idx ON queue_jobs (leader_id);
+"""
+
+
+class QueueFullError(Exception):
+    """Raised by enqueue() when the queue is at its maximum depth."""
+
+    def __init__(self, depth, max_depth):
+        super().__init__(f"Job queue is full ({depth}/{max_depth} queued)")
+        self.depth = depth
+        self.max_depth = max_depth
+
+
+class JobQueue:
+    """
+    Durable FIFO job queue on SQLite.
+
+    Jobs survive restarts: anything still queued is picked up again, and
+    running jobs whose worker stops heartbeating are requeued (up to
+    max_attempts). Claims use BEGIN IMMEDIATE, so several processes can
+    share one queue file without handing the same job out twice.
+
+    Jobs enqueued with a dedupe key are coalesced: while a job with the same
+    key is queued or running, or finished successfully within the coalesce
+    window, the new job is recorded as a follower of it ("coalesced") instead
+    of being queued, and it finishes when its leader does.
+
+    The file (and its directory) is created on first use, not on construction.
+    """
+
+    def __init__(self, path=JOB_QUEUE_PATH, max_depth=JOB_QUEUE_MAX_DEPTH,
+                 stale_after=JOB_STALE_AFTER, max_attempts=JOB_MAX_ATTEMPTS,
+                 coalesce_window=JOB_COALESCE_WINDOW):
+        self.path = path
+        self.max_depth = max_depth
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.coalesce_window = coalesce_window
+        self.job_available = threading.Event()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _ensure_schema(self):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._open()
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(queue_jobs)")}
+                for column, statement in MIGRATIONS.items():
+                    if column not in columns:
+                        conn.execute(statement)
+                conn.executescript(INDEXES)
+            finally:
+                conn.close()
+            self._schema_ready = True
+
+    def _connect(self):
+        # One short-lived connection per operation keeps this safe across threads
+        if not self._schema_ready:
+            self._ensure_schema()
+        return self._open()
+
+    def enqueue(self, job_id: str, kind: str, payload: Dict[str, Any], dedupe_key: Optional[str] = None) -> str:
+        """
+        Adds a job, or raises QueueFullError when max_depth jobs are already waiting.
+
+        Returns the id of the job that will do the work: job_id itself, or the
+        leader it was coalesced onto when dedupe_key matches an in-flight or
+        recently completed job.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            leader = None
+            if dedupe_key is not None:
+                leader = conn.execute(
+                    "SELECT id, status FROM queue_jobs WHERE dedupe_key = ? AND leader_id IS NULL AND "
+                    "(status IN ('queued', 'running') OR (status = 'done' AND finished_at >= ?)) "
+                    "ORDER BY enqueued_at DESC LIMIT 1",
+                    (dedupe_key, now - self.coalesce_window)
+                ).fetchone()
+            if leader is not None:
+                # Followers never reach a worker, so they don't count against max_depth
+                finished = leader["status"] == "done"
+                conn.execute(
+                    "INSERT INTO queue_jobs (id, kind, payload, status, enqueued_at, finished_at, dedupe_key, leader_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, json.dumps(payload), "done" if finished else "coalesced", now,
+                     now if finished else None, dedupe_key, leader["id"])
+                )
+                conn.execute("COMMIT")
+                return leader["id"]
+            depth = conn.execute("SELECT COUNT(*) FROM queue_jobs WHERE status = 'queued'").fetchone()[0]
+            if depth >= self.max_depth:
+                conn.execute("ROLLBACK")
+                raise QueueFullError(depth, self.max_depth)
+            conn.execute(
+                "INSERT INTO queue_jobs (id, kind, payload, status, enqueued_at, dedupe_key) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload), now, dedupe_key)
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        self.job_available.set()
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Marks the oldest queued job as running and returns it, or None if the queue is empty."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM queue_jobs WHERE status = 'queued' ORDER BY enqueued_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE queue_jobs SET status = 'running', attempts = attempts + 1, started_at = ?, "
+                "heartbeat_at = ?, worker = ? WHERE id = ?",
+                (now, now, worker, row["id"])
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["wait_seconds"] = now - job["enqueued_at"]
+        return job
+
+    def heartbeat(self, job_ids) -> None:
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+        conn = self._connect()
+        try:
+            conn.execute(
+                f"UPDATE queue_jobs SET heartbeat_at = ? WHERE id IN ({','.join('?' * len(job_ids))})",
+                [time.time(), *job_ids]
+            )
+        finally:
+            conn.close()
+
+    def finish(self, job_id: str, error: Optional[str] = None) -> None:
+        """Records a job's outcome, and the same outcome for every job coalesced onto it."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE queue_jobs SET status = ?, finished_at = ?, error = ? "
+                "WHERE id = ? OR (leader_id = ? AND status = 'coalesced')",
+                ("failed" if error else "done", time.time(), error, job_id, job_id)
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def followers(self, job_id: str) -> List[str]:
+        """Ids of the jobs coalesced onto job_id."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT id FROM queue_jobs WHERE leader_id = ?", (job_id,)).fetchall()
+        finally:
+            conn.close()
+        return [row["id"] for row in rows]
+
+    def recover_stale(self) -> int:
+        """Requeues (or fails, after max_attempts) running jobs whose worker went away."""
+        cutoff = time.time() - self.stale_after
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            failed = [row["id"] for row in conn.execute(
+                "SELECT id FROM queue_jobs WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+                (cutoff, self.max_attempts)
+            )]
+            for job_id in failed:
+                conn.execute(
+                    "UPDATE queue_jobs SET status = 'failed', finished_at = ?, error = 'worker stopped responding' "
+                    "WHERE id = ? OR (leader_id = ? AND status = 'coalesced')",
+                    (time.time(), job_id, job_id)
+                )
+            requeued = conn.execute(
+                "UPDATE queue_jobs SET status = 'queued', worker = NULL "
+                "WHERE status = 'running' AND heartbeat_at < ?",
+                (cutoff,)
+            ).rowcount
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        if requeued:
+            print(f"Requeued {requeued} interrupted job(s).")
+            self.job_available.set()
+        return requeued
+
+    def prune_finished(self, older_than: float = JOB_RETENTION) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "DELETE FROM queue_jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - older_than,)
+            ).rowcount
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and wait times for monitoring."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM queue_jobs GROUP BY status").fetchall())
+            oldest = conn.execute("SELECT MIN(enqueued_at) FROM queue_jobs WHERE status = 'queued'").fetchone()[0]
+            avg_wait = conn.execute(
+                "SELECT AVG(started_at - enqueued_at) FROM (SELECT started_at, enqueued_at FROM queue_jobs "
+                "WHERE started_at IS NOT NULL ORDER BY started_at DESC LIMIT 100)"
+            ).fetchone()[0]
+        finally:
+            conn.close()
+        return {
+            "depth": counts.get("queued", 0),
+            "max_depth": self.max_depth,
+            "running": counts.get("running", 0),
+            "coalesced": counts.get("coalesced", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_wait_seconds": round(now - oldest, 1) if oldest else 0,
+            "avg_wait_seconds": round(avg_wait, 2) if avg_wait is not None else None,
+        }
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM queue_jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row else None
@@ -0,0 +1,94 @@
+import os
+import socket
+import threading
+import traceback
+
+# Number of jobs processed at the same time by one pool
+SCRAPE_WORKERS = int(os.environ.get("SCRAPE_WORKERS", "2"))
+# Seconds an idle worker sleeps before polling the queue again
+WORKER_POLL_INTERVAL = float(os.environ.get("WORKER_POLL_INTERVAL", "1.0"))
+# Seconds between heartbeats for running jobs
+WORKER_HEARTBEAT_INTERVAL = float(os.environ.get("WORKER_HEARTBEAT_INTERVAL", "30"))
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of threads draining a JobQueue.
+
+    `handlers` maps a job kind to a callable taking (job_id, payload). The
+    pool heartbeats its running jobs so another process can requeue them if
+    this one dies, and periodically requeues jobs abandoned by others.
+    """
+
+    def __init__(self, queue, handlers, size=SCRAPE_WORKERS, name=None):
+        self.queue = queue
+        self.handlers = handlers
+        self.size = max(1, size)
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.running_jobs = set()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Starts the workers; later calls (from any thread) do nothing."""
+        with self._start_lock:
+            if self._threads:
+                return
+            self.queue.recover_stale()
+            for index in range(self.size):
+                thread = threading.Thread(target=self._work, args=(f"{self.name}/{index}",),
+                                          name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            heartbeat = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+            heartbeat.start()
+            self._threads.append(heartbeat)
+        print(f"Worker pool {self.name} started with {self.size} worker(s).")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self.queue.job_available.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def _work(self, worker_name):
+        while not self._stop.is_set():
+            job = self.queue.claim(worker_name)
+            if job is None:
+                self.queue.job_available.wait(WORKER_POLL_INTERVAL)
+                self.queue.job_available.clear()
+                continue
+
+            with self._lock:
+                self.running_jobs.add(job["id"])
+            print(f"[{worker_name}] Running {job['kind']} job {job['id']} "
+                  f"(waited {job['wait_seconds']:.1f}s, attempt {job['attempts'] + 1}).")
+            error = None
+            try:
+                handler = self.handlers[job["kind"]]
+                handler(job["id"], job["payload"])
+            except Exception as e:
+                error = f"{e}\n{traceback.format_exc()}"
+                print(f"[{worker_name}] Job {job['id']} raised: {e}")
+            finally:
+                with self._lock:
+                    self.running_jobs.discard(job["id"])
+                self.queue.finish(job["id"], error)
+
+    def _heartbeat(self):
+        while not self._stop.wait(WORKER_HEARTBEAT_INTERVAL):
+            try:
+                with self._lock:
+                    running = list(self.running_jobs)
+                self.queue.heartbeat(running)
+                self.queue.recover_stale()
+                self.queue.prune_finished()
+            except Exception as e:
+                print(f"Worker heartbeat failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            running = len(self.running_jobs)
+        return {"name": self.name, "workers": self.size, "busy": running}